@@ -1,15 +1,33 @@
+import copy  # 复制操作
 import os  # 文件操作
+import pickle  # 序列化操作
 import time  # 时间操作
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor  # 并行操作
 
 import numpy as np  # 数组操作
+from numpy.lib.stride_tricks import sliding_window_view  # 滑动窗口视图
 from PIL import Image  # 图像操作
 
 
 class ImageData:
 
+    # 常量
+    METHODS = ('auto', 'direct', 'separable', 'fft', 'box')  # 线性滤波的计算方式
+    FFT_COST = 0.7  # 一次正反傅里叶变换每个元素每级蝶形运算的代价，以移位累加中一次乘加为单位
+    FFT_PIXELS = 2**20  # 扩展后图像不超过该像素数时整幅进行傅里叶变换，否则分块
+    PARTITION_SIZE = 81  # 排序统计滤波的窗口像素数不超过该值时直接部分排序，否则使用滑动直方图
+    TILE_ROWS = 32  # 行带的最少行数，限制重叠行的额外开销
+    TILES_PER_WORKER = 4  # 每个线程（进程）平均分到的行带数量，使各行带耗时不均时负载仍然均衡
+    RESULTS = ('filter_matrix', 'gradient_x', 'gradient_y', 'gradient_orientation')  # 滤波结果，行带子任务不携带
+
     # 初始化
-    def __init__(self, image_name):
+    def __init__(self, image_name, method='auto', workers=None, kernel=None):
         self.image_name = image_name  # 图像的名称
+        if method not in self.METHODS:  # 不支持的计算方式
+            raise ValueError('Unknown method %s, expected one of %s' % (method, ', '.join(self.METHODS)))
+        self.method = method  # 线性滤波的计算方式，auto根据代价估计自动选择，其余用于强制指定以便对比性能
+        self.workers = workers or os.cpu_count() or 1  # 并行处理行带的线程（进程）数量，默认为处理器核心数
+        self.kernel = kernel  # 自定义空间滤波函数，参数为窗口矩阵，返回该像素的滤波结果，用于custom滤波模式；模块级函数可序列化，使用进程池
 
     # 矩阵标定化
     def normalize(self, matrix):
@@ -33,45 +51,108 @@ class ImageData:
         image_splice.save(self.image_name.replace('.', '_') + '_' + self.processing_mode + '_by_' + self.filter_mode + '_filter_using_' + self.padding_mode + '_padding.png')  # 保存图像
         # image_splice.show()  # 运行程序时显示图像
 
-    # 零扩展
-    def zero_padding(self):
-        pass  # 原扩展矩阵为零矩阵，不需要额外处理
-
-    # 镜面扩展
-    def mirror_padding(self):
-
-        # 四角
-        self.padding_matrix[:self.pad_h, :self.pad_w] = np.rot90(self.image_matrix[1:1 + self.pad_h, 1:1 + self.pad_w], 2)  # 左上角
-        self.padding_matrix[self.pad_h + self.image_height:, :self.pad_w] = np.rot90(self.image_matrix[-1 - self.pad_h:-1, 1:1 + self.pad_w], 2)  # 左下角
-        self.padding_matrix[:self.pad_h, self.pad_w + self.image_width:] = np.rot90(self.image_matrix[1:1 + self.pad_h, -1 - self.pad_w:-1], 2)  # 右上角
-        self.padding_matrix[self.pad_h + self.image_height:, self.pad_w + self.image_width:] = np.rot90(self.image_matrix[-1 - self.pad_h:-1, -1 - self.pad_w:-1], 2)  # 右下角
-
-        # 四边
-        self.padding_matrix[:self.pad_h, self.pad_w:self.pad_w + self.image_width] = np.flipud(self.image_matrix[1:1 + self.pad_h, :])  # 上边框
-        self.padding_matrix[self.pad_h + self.image_height:, self.pad_w:self.pad_w + self.image_width] = np.flipud(self.image_matrix[-1 - self.pad_h:-1, :])  # 下边框
-        self.padding_matrix[self.pad_h:self.pad_h + self.image_height, :self.pad_w] = np.fliplr(self.image_matrix[:, 1:1 + self.pad_w])  # 左边框
-        self.padding_matrix[self.pad_h:self.pad_h + self.image_height, self.pad_w + self.image_width:] = np.fliplr(self.image_matrix[:, -1 - self.pad_w:-1])  # 右边框
-
-    # 复制扩展
-    def replicate_padding(self):
-
-        # 四角
-        self.padding_matrix[:self.pad_h, :self.pad_w] = self.image_matrix[0, 0]  # 左上角
-        self.padding_matrix[self.pad_h + self.image_height:, :self.pad_w] = self.image_matrix[-1, 0]  # 左下角
-        self.padding_matrix[:self.pad_h, self.pad_w + self.image_width:] = self.image_matrix[0, -1]  # 右上角
-        self.padding_matrix[self.pad_h + self.image_height:, self.pad_w + self.image_width:] = self.image_matrix[-1, -1]  # 右下角
-
-        # 四边
-        self.padding_matrix[:self.pad_h, self.pad_w:self.pad_w + self.image_width] = self.image_matrix[0:1, :]  # 上边框
-        self.padding_matrix[self.pad_h + self.image_height:, self.pad_w:self.pad_w + self.image_width] = self.image_matrix[-2:-1, :]  # 下边框
-        self.padding_matrix[self.pad_h:self.pad_h + self.image_height, :self.pad_w] = self.image_matrix[:, 0:1]  # 左边框
-        self.padding_matrix[self.pad_h:self.pad_h + self.image_height, self.pad_w + self.image_width:] = self.image_matrix[:, -2:-1]  # 右边框
-
-    # 扩展算法
+    # 零扩展：扩展区域的序号记为-1，读取时置零
+    def zero_padding(self, index, length):
+        return np.where((index >= 0) & (index < length), index, -1)
+
+    # 镜面扩展：以边缘像素为轴对称，不重复边缘像素
+    def mirror_padding(self, index, length):
+        period = max(2 * (length - 1), 1)  # 对称扩展的周期
+        index = np.abs(index) % period  # 折叠至一个周期内
+        return np.where(index < length, index, period - index)
+
+    # 复制扩展：扩展区域取最近的边缘像素
+    def replicate_padding(self, index, length):
+        return np.clip(index, 0, length - 1)
+
+    # 扩展算法：不生成扩展矩阵，只记录扩展后每行、每列对应的原图像行列序号，扩展区域在读取时按序号映射
     def padding(self):
-        self.padding_matrix = np.zeros(np.array(self.image_shape) + np.array(self.filter_shape) - 1)  # 生成扩展矩阵
-        self.padding_matrix[self.pad_h:self.pad_h + self.image_height, self.pad_w:self.pad_w + self.image_width] = self.image_matrix  # 将原图像复制至扩展矩阵中心
-        getattr(self, '%s_padding' % self.padding_mode)()  # 对原图像四周进行扩展
+        self.padding_shape = (self.image_height + self.filter_height - 1, self.image_width + self.filter_width - 1)  # 扩展后的形状
+        self.row_index = getattr(self, '%s_padding' % self.padding_mode)(np.arange(self.padding_shape[0]) - self.pad_h, self.image_height)  # 扩展后每行对应的原图像行
+        self.column_index = getattr(self, '%s_padding' % self.padding_mode)(np.arange(self.padding_shape[1]) - self.pad_w, self.image_width)  # 扩展后每列对应的原图像列
+
+    # 读取扩展后图像的区域[top:bottom, left:right]，默认为整幅：区域位于原图像内时返回原图像的视图，不复制数据，否则按行列序号映射读取
+    def padded(self, top=0, bottom=None, left=0, right=None, matrix=None):
+        matrix = self.image_matrix if matrix is None else matrix  # 被扩展的图像，默认为原图像
+        bottom = self.padding_shape[0] if bottom is None else min(bottom, self.padding_shape[0])  # 区域的下边界
+        right = self.padding_shape[1] if right is None else min(right, self.padding_shape[1])  # 区域的右边界
+        rows, columns = self.row_index[top:bottom], self.column_index[left:right]  # 区域对应的原图像行列序号
+        if len(rows) and rows[0] >= 0 and rows[-1] - rows[0] == len(rows) - 1:  # 行序号连续（相邻行序号之差不超过1），行位于原图像内，直接切片
+            region = matrix[rows[0]:rows[-1] + 1]
+        else:  # 按行序号映射读取，整行复制
+            region = matrix[np.maximum(rows, 0)]
+        if left >= self.pad_w and right <= self.pad_w + self.image_width:  # 列位于原图像内，直接切片
+            region = region[:, left - self.pad_w:right - self.pad_w]
+        else:  # 内部列直接复制，扩展列按序号映射读取
+            source, region = region, np.empty((len(rows), len(columns)), dtype=matrix.dtype)  # 行读取结果与区域矩阵
+            start = min(max(self.pad_w - left, 0), len(columns))  # 区域中位于原图像内的第一列
+            stop = max(min(self.pad_w + self.image_width - left, len(columns)), start)  # 区域中位于原图像内的最后一列之后
+            region[:, start:stop] = source[:, start + left - self.pad_w:stop + left - self.pad_w]  # 内部列直接复制
+            edge = np.r_[0:start, stop:len(columns)]  # 扩展列
+            region[:, edge] = source[:, np.maximum(columns[edge], 0)]  # 扩展列按序号映射读取
+        if self.padding_mode == 'zero':  # 零扩展区域置零
+            region[rows < 0] = 0
+            region[:, columns < 0] = 0
+        return region
+
+    # 读取指定像素的扩展窗口，返回(像素数量, 滤波器高, 滤波器宽)的数组，只读取窗口内的像素
+    def padded_windows(self, rows, columns):
+        row_index = self.row_index[rows[:, np.newaxis] + np.arange(self.filter_height)]  # 每个窗口的行序号
+        column_index = self.column_index[columns[:, np.newaxis] + np.arange(self.filter_width)]  # 每个窗口的列序号
+        windows = self.image_matrix[np.maximum(row_index, 0)[:, :, np.newaxis], np.maximum(column_index, 0)[:, np.newaxis, :]]  # 按序号映射读取
+        if self.padding_mode == 'zero':  # 零扩展区域置零
+            windows[(row_index < 0)[:, :, np.newaxis] | (column_index < 0)[:, np.newaxis, :]] = 0
+        return windows
+
+    # 行带子任务：结果第[top, bottom)行只依赖扩展后图像第[top, bottom + 滤波器高 - 1)行，即上下各带滤波器半径的重叠行；
+    # 子任务只保留这些行对应的原图像行，行序号随之平移，图像边界的扩展方式与整幅处理相同
+    def band(self, top, bottom, matrix):
+        rows = self.row_index[top:bottom + self.filter_height - 1]  # 行带扩展后各行对应的原图像行
+        start, stop = rows[rows >= 0].min(), rows.max() + 1  # 所需的原图像行
+        band = copy.copy(self)  # 浅复制，共享滤波器参数与列序号
+        for name in self.RESULTS:  # 不携带之前的滤波结果
+            band.__dict__.pop(name, None)
+        band.image_matrix = matrix[start:stop]  # 原图像行的视图，不复制数据
+        band.row_index = np.where(rows >= 0, rows - start, -1)  # 平移后的行序号，零扩展区域仍为-1
+        band.image_shape = (bottom - top, self.image_width)  # 行带结果的形状
+        band.image_height, band.image_width = band.image_shape  # 行带结果的高与宽
+        band.image_size = band.image_height * band.image_width  # 行带结果的面积
+        band.padding_shape = (len(rows), self.padding_shape[1])  # 行带扩展后的形状
+        return band
+
+    # 执行行带子任务，返回结果与需要拼接的属性
+    @staticmethod
+    def run_band(band, name, args, attributes):
+        result = getattr(band, name)(*args)  # 行带结果
+        return result, [getattr(band, attribute) for attribute in attributes]
+
+    # 按行拼接各行带的结果：数组直接拼接，元组逐项拼接，None保持不变
+    @classmethod
+    def stitch(cls, results):
+        if isinstance(results[0], tuple):  # 多个结果
+            return tuple(cls.stitch(list(parts)) for parts in zip(*results))
+        return None if results[0] is None else np.concatenate(results)
+
+    # 行带并行：将结果按行划分为行带，每个行带执行name方法后按行拼接，与整幅处理的结果相同；
+    # NumPy运算会释放GIL，使用线程池，共享原图像；Python逐像素运算受GIL限制，使用进程池，只传递行带所需的原图像行，滤波函数需可序列化
+    def tiled(self, name, *args, matrix=None, attributes=(), processes=False):
+        matrix = self.image_matrix if matrix is None else matrix  # 被滤波的图像，默认为原图像
+        rows = max(-(-self.image_height // (self.TILES_PER_WORKER * self.workers)), self.TILE_ROWS, self.filter_height)  # 每个行带的行数
+        bands = [self.band(top, min(top + rows, self.image_height), matrix) for top in range(0, self.image_height, rows)]  # 行带子任务
+        if self.workers == 1 or len(bands) == 1:  # 不需要并行
+            results = [self.run_band(band, name, args, attributes) for band in bands]
+        else:  # 线程池或进程池并行，按行带顺序返回
+            with (ProcessPoolExecutor if processes else ThreadPoolExecutor)(max_workers=self.workers) as executor:
+                results = list(executor.map(self.run_band, bands, [name] * len(bands), [args] * len(bands), [attributes] * len(bands)))
+        for i, attribute in enumerate(attributes):  # 拼接属性
+            setattr(self, attribute, self.stitch([values[i] for _, values in results]))
+        return self.stitch([result for result, _ in results])
+
+    # 自定义滤波器
+    def custom_filter(self):
+        if self.kernel is None:  # 未提供自定义空间滤波函数
+            raise ValueError('Filter mode %s requires a kernel function' % self.filter_mode)
+        return self.kernel
 
     # 均值滤波器
     def box_filter(self):
@@ -90,13 +171,29 @@ class ImageData:
     def median_filter(self):
         return np.median  # 求中值
 
+    # 百分位滤波器
+    def percentile_filter(self):
+        return lambda matrix: np.percentile(matrix, self.percentile, method='nearest')  # 求百分位数，取最接近的排序值
+
     # 最大值滤波器
     def max_filter(self):
-        return np.max  # 求最大值
+        return (np.maximum, )  # 膨胀：求窗口内最大值
 
     # 最小值滤波器
     def min_filter(self):
-        return np.min  # 求最小值
+        return (np.minimum, )  # 腐蚀：求窗口内最小值
+
+    # 开运算滤波器
+    def opening_filter(self):
+        return (np.minimum, np.maximum)  # 先腐蚀后膨胀，去除比窗口小的亮细节
+
+    # 闭运算滤波器
+    def closing_filter(self):
+        return (np.maximum, np.minimum)  # 先膨胀后腐蚀，填充比窗口小的暗细节
+
+    # 顶帽滤波器
+    def tophat_filter(self):
+        return self.opening_filter()  # 原图减去开运算结果，提取比窗口小的亮细节
 
     # 拉普拉斯滤波器
     def laplacian_filter(self):
@@ -112,13 +209,249 @@ class ImageData:
 
     # 普鲁伊特滤波器
     def prewitt_filter(self):
-        G_x, G_y = np.array([[-1, -1, -1], [0, 0, 0], [1, 1, 1]]), np.array([[-1, 0, 1], [-1, 0, 1], [-1, 0, 1]])  # 普鲁伊特算子
-        return lambda matrix: np.sqrt(np.sum(G_x * matrix)**2 + np.sum(G_y * matrix)**2)  # 计算梯度矩阵
+        return np.array([1, 1, 1]), np.array([-1, 0, 1])  # 普鲁伊特算子的平滑向量与差分向量，G_x为二者的外积，G_y为其转置
 
     # 索伯滤波器
     def sobel_filter(self):
-        G_x, G_y = np.array([[-1, -2, -1], [0, 0, 0], [1, 2, 1]]), np.array([[-1, 0, 1], [-2, 0, 2], [-1, 0, 1]])  # 索伯算子
-        return lambda matrix: np.sqrt(np.sum(G_x * matrix)**2 + np.sum(G_y * matrix)**2)  # 计算梯度矩阵
+        return np.array([1, 2, 1]), np.array([-1, 0, 1])  # 索伯算子的平滑向量与差分向量
+
+    # 沙尔滤波器
+    def scharr_filter(self):
+        return np.array([3, 10, 3]), np.array([-1, 0, 1])  # 沙尔算子的平滑向量与差分向量，方向一致性优于索伯算子
+
+    # 秩一分解：可分离的滤波窗口返回(列向量, 行向量)，否则返回None
+    def separate(self, kernel):
+        i, j = np.unravel_index(np.argmax(np.abs(kernel)), kernel.shape)  # 以绝对值最大的元素为主元
+        column, row = kernel[:, j] / kernel[i, j], kernel[i, :]  # 列向量与行向量
+        return (column, row) if np.allclose(np.outer(column, row), kernel, rtol=1e-12, atol=1e-15) else None  # 外积还原滤波窗口时可分离
+
+    # 移位累加：对每个滤波窗口元素，将对应平移的区域与权重相乘后累加，整幅图像一次完成；matrix为数组或按区域读取扩展后图像的函数
+    def correlate(self, matrix, kernel, shape):
+        read = matrix if callable(matrix) else lambda top, bottom, left, right: matrix[top:bottom, left:right]  # 读取平移后的区域
+        result = np.zeros(shape, dtype=np.result_type(self.image_matrix if callable(matrix) else matrix, kernel))  # 累加矩阵
+        for (i, j), weight in np.ndenumerate(kernel):  # 遍历滤波窗口元素
+            if weight:  # 跳过零权重
+                result += weight * read(i, i + shape[0], j, j + shape[1])  # 累加平移后的区域
+        return result
+
+    # 积分图像求窗口和：每个窗口和由积分图像的四个角点相加减得到，代价与窗口大小无关
+    def box_sum(self, matrix):
+        integral = np.zeros(np.array(matrix.shape) + 1, dtype=np.int64)  # 积分图像，首行首列为零
+        integral[1:, 1:] = matrix.cumsum(axis=0, dtype=np.int64).cumsum(axis=1)  # 左上方所有像素之和
+        H, W = self.image_shape  # 结果矩阵的高与宽
+        return (
+            integral[self.filter_height:self.filter_height + H, self.filter_width:self.filter_width + W] - integral[:H, self.filter_width:self.filter_width + W]
+            - integral[self.filter_height:self.filter_height + H, :W] + integral[:H, :W]
+        )  # 右下角 - 右上角 - 左下角 + 左上角
+
+    # 判断窗口内像素是否全部相同：窗口内像素和S1与平方和S2满足N*S2 = S1^2，整数运算精确
+    def uniform_windows(self, rows, columns):
+        matrix = self.padded().astype(np.int64)  # 整数扩展后图像
+        S1, S2 = self.box_sum(matrix), self.box_sum(matrix**2)  # 窗口内像素和与平方和
+        return (self.filter_height * self.filter_width * S2 == S1**2)[rows, columns]
+
+    # 逐窗口精确求和：与np.sum(kernel * window)的求和顺序相同，用于复核截断临界的像素
+    def window_sum(self, kernel, rows, columns):
+        result = np.empty(len(rows))  # 复核结果
+
+        # 像素全部相同的窗口（平坦区域）求和结果只取决于像素值，每个像素值只计算一次
+        uniform = self.uniform_windows(rows, columns)  # 平坦窗口
+        centers = self.row_index[rows[uniform] + self.pad_h], self.column_index[columns[uniform] + self.pad_w]  # 平坦窗口中心对应的原图像像素
+        levels, inverse = np.unique(self.image_matrix[centers], return_inverse=True)  # 平坦窗口的像素值
+        result[uniform] = (kernel * levels[:, np.newaxis, np.newaxis]).reshape(len(levels), kernel.size).sum(axis=1)[inverse]  # 查表
+
+        # 其余窗口逐个求和
+        rows, columns, others = rows[~uniform], columns[~uniform], np.flatnonzero(~uniform)  # 非平坦窗口
+        block = max(2**22 // kernel.size, 1)  # 每次复核的像素数量，限制临时数组的大小
+        for start in range(0, len(rows), block):  # 分块复核
+            products = kernel * self.padded_windows(rows[start:start + block], columns[start:start + block])  # 窗口与滤波窗口相乘
+            result[others[start:start + block]] = products.reshape(len(products), -1).sum(axis=1)  # 按连续内存逐窗口求和
+        return result
+
+    # 傅里叶变换的分块：返回每块结果的(高, 宽)，扩展后图像较小时整幅变换，否则每块的变换边长为不小于4倍滤波器边长的2的幂
+    def fft_block(self):
+        if np.prod(np.array(self.image_shape) + self.filter_shape) <= self.FFT_PIXELS:  # 整幅变换
+            return self.image_shape
+        side = 2**int(np.ceil(np.log2(max(4 * max(self.filter_shape), 256))))  # 变换边长
+        return side - self.filter_height + 1, side - self.filter_width + 1
+
+    # 傅里叶变换相关：每块取扩展后图像中(块高 + 滤波器高 - 1) * (块宽 + 滤波器宽 - 1)的区域与滤波器频谱的共轭相乘，逆变换后只保留无循环混叠的部分
+    def fft_correlate(self, kernel):
+        (H, W), (bh, bw) = self.image_shape, self.fft_block()  # 结果矩阵与每块的尺寸
+        fft_shape = (bh + self.filter_height - 1, bw + self.filter_width - 1)  # 变换尺寸
+        spectrum = np.conj(np.fft.rfft2(kernel, fft_shape))  # 滤波器频谱的共轭，相关不翻转滤波器
+        result = np.empty(self.image_shape)  # 结果矩阵
+        for top in range(0, H, bh):  # 遍历块
+            for left in range(0, W, bw):
+                region = self.padded(top, top + fft_shape[0], left, left + fft_shape[1])  # 块对应的扩展后图像区域，内部块不复制数据
+                block = np.fft.irfft2(np.fft.rfft2(region, fft_shape) * spectrum, fft_shape)  # 循环相关
+                h, w = min(bh, H - top), min(bw, W - left)  # 块的有效尺寸
+                result[top:top + h, left:left + w] = block[:h, :w]  # 保留无混叠的部分
+        return result
+
+    # 估计各计算方式的代价（以一次乘加为单位），只包含适用于当前滤波器的方式
+    def method_costs(self, kernel):
+        H, W = self.image_shape  # 结果矩阵的高与宽
+        costs = {'direct': H * W * np.count_nonzero(kernel)}  # 移位累加：每个非零元素一次乘加
+        if self.filter_mode.split('-')[0] == 'box':  # 积分图像：两次累加与四次查表
+            costs['box'] = 6 * (H + self.filter_height) * (W + self.filter_width)
+        if self.separate(kernel) is not None:  # 可分离：行、列一维滤波
+            costs['separable'] = (H + self.filter_height - 1) * W * self.filter_width + H * W * self.filter_height
+        bh, bw = self.fft_block()  # 每块的尺寸
+        size = (bh + self.filter_height - 1) * (bw + self.filter_width - 1)  # 每块的变换尺寸
+        costs['fft'] = int(np.ceil(H / bh) * np.ceil(W / bw) * size * (self.FFT_COST * np.log2(size) + 1))  # 每块一次正反变换与一次频域乘法
+        return costs
+
+    # 选择线性滤波的计算方式：auto时选择代价最小的方式，强制指定的方式不适用时报错
+    def select_method(self, kernel):
+        costs = self.method_costs(kernel)  # 适用的计算方式与代价
+        if self.method == 'auto':  # 自动选择
+            return min(costs, key=costs.get)
+        if self.method not in costs:  # 强制指定的方式不适用，如不可分离的滤波器
+            raise ValueError('Method %s is not applicable to %s filter' % (self.method, self.filter_mode))
+        return self.method
+
+    # 向量化线性滤波：根据代价估计选择移位累加、可分离一维滤波、傅里叶变换或积分图像，结果截断为整数
+    def linear_filtering(self, kernel, method=None):
+
+        self.selected_method = method or self.select_method(kernel)  # 本次使用的计算方式，行带并行时由整幅图像选定，使各行带一致
+
+        if self.selected_method == 'box':  # 均值滤波，窗口和由积分图像整数计算，代价与窗口大小无关
+            quotient, remainder = np.divmod(self.box_sum(self.padded()), kernel.size)  # 窗口均值的整数部分与余数
+            rows, columns = np.nonzero(remainder == 0)  # 整除的像素，逐窗口浮点求和可能略小于整数
+            quotient[rows, columns] = np.trunc(self.window_sum(kernel, rows, columns))  # 精确复核
+            return quotient
+
+        if self.selected_method == 'direct' and np.array_equal(kernel, np.round(kernel)):  # 整数滤波窗口，如拉普拉斯，整数运算精确
+            return self.correlate(self.padded, kernel.astype(int), self.image_shape)
+
+        if self.selected_method == 'direct':  # 移位累加
+            result = self.correlate(self.padded, kernel, self.image_shape)
+        elif self.selected_method == 'separable':  # 可分离，如均值、高斯，运算量由窗口面积降为边长之和
+            column, row = self.separate(kernel)  # 秩一分解
+            result = self.correlate(self.padded, row[np.newaxis], (self.padding_shape[0], self.image_width))  # 行方向一维滤波
+            result = self.correlate(result, column[:, np.newaxis], self.image_shape)  # 列方向一维滤波
+        else:  # 傅里叶变换，运算量与滤波器尺寸基本无关，适合大尺寸滤波器
+            result = self.fft_correlate(kernel)
+
+        # 求和顺序不同会带来微小的舍入误差，接近整数的像素逐窗口复核，保证截断结果与逐窗口求和一致
+        rows, columns = np.nonzero(np.abs(result - np.round(result)) < 1e-6)  # 截断临界的像素
+        result[rows, columns] = self.window_sum(kernel, rows, columns)  # 精确复核
+        return np.trunc(result).astype(int)  # 向零截断，与int()一致
+
+    # van Herk/Gil-Werman一维最大值（最小值）滤波：沿最后一维按窗口长度分块，块内前缀与后缀累计极值，
+    # 每个窗口恰好跨越一个块边界，结果为后缀极值与前缀极值的较大（较小）者，每个像素约三次比较，与窗口长度无关
+    def van_herk(self, matrix, size, function):
+        length = matrix.shape[-1] - size + 1  # 结果长度
+        blocks = -(-matrix.shape[-1] // size)  # 块数量
+        padded = np.pad(matrix, ((0, 0), (0, blocks * size - matrix.shape[-1])), mode='edge').reshape(len(matrix), blocks, size)  # 补齐至块长度的整数倍，补齐部分不会进入任何窗口
+        prefix = function.accumulate(padded, axis=2).reshape(len(matrix), -1)  # 块内从左至右的累计极值
+        suffix = function.accumulate(padded[:, :, ::-1], axis=2)[:, :, ::-1].reshape(len(matrix), -1)  # 块内从右至左的累计极值
+        return function(suffix[:, :length], prefix[:, size - 1:size - 1 + length])  # 窗口[i, i + size)的极值
+
+    # 二维最大值（最小值）滤波：行、列两次一维滤波，所有行（列）同时处理
+    def extremum_filtering(self, function):
+        matrix = self.van_herk(self.padded(), self.filter_width, function)  # 行方向
+        return self.van_herk(matrix.T, self.filter_height, function).T  # 列方向
+
+    # 形态学滤波：依次进行腐蚀、膨胀，每次运算按行带并行，后续运算以相同的扩展模式读取拼接后的中间结果
+    def morphology_filtering(self, operations):
+        result = self.image_matrix  # 第一次运算的输入为原图像
+        for function in operations:  # 依次运算
+            result = self.tiled('extremum_filtering', function, matrix=result)
+        return result.astype(int)
+
+    # 梯度：G_x（行方向差分、列方向平滑）与G_y（行方向平滑、列方向差分）由可分离的一维整数滤波得到，
+    # 梯度幅值可选l2（float64，与逐窗口计算一致）、float32或l1（|G_x| + |G_y|，整数近似），可选返回梯度方向arctan2(G_y, G_x)
+    def gradient(self, kernel, magnitude='l2', orientation=False):
+
+        smooth, difference = kernel  # 平滑向量与差分向量
+        shape = (self.padding_shape[0], self.image_width)  # 行方向一维滤波结果的尺寸
+        smooth, difference = smooth.astype(np.int32), difference.astype(np.int32)  # 32位整数运算，沙尔算子的梯度平方和也不会溢出
+        self.gradient_x = self.correlate(self.correlate(self.padded, smooth[np.newaxis], shape), difference[:, np.newaxis], self.image_shape)  # G_x
+        self.gradient_y = self.correlate(self.correlate(self.padded, difference[np.newaxis], shape), smooth[:, np.newaxis], self.image_shape)  # G_y
+
+        if magnitude == 'l1':  # 整数近似
+            result = (np.abs(self.gradient_x) + np.abs(self.gradient_y)).astype(int)
+        elif magnitude == 'float32':  # 单精度，内存与带宽减半
+            result = np.hypot(self.gradient_x.astype(np.float32), self.gradient_y.astype(np.float32)).astype(int)
+        else:  # 双精度
+            result = np.sqrt(self.gradient_x**2 + self.gradient_y**2).astype(int)
+
+        direction = None  # 梯度方向（弧度）
+        if orientation:  # 需要梯度方向
+            dtype = np.float32 if magnitude == 'float32' else np.float64  # 与梯度幅值的精度一致
+            direction = np.arctan2(self.gradient_y.astype(dtype), self.gradient_x.astype(dtype))
+        return result, direction
+
+    # 部分排序求窗口内第rank个像素，适用于小窗口
+    def partition_filtering(self, rank):
+        result = np.empty(self.image_shape, dtype=int)  # 结果矩阵
+        rows = max(2**22 // (self.image_width * self.filter_height * self.filter_width), 1)  # 每次处理的行数，限制临时数组的大小
+        for top in range(0, self.image_height, rows):  # 分块处理
+            windows = sliding_window_view(self.padded(top, top + rows + self.filter_height - 1), self.filter_shape)  # 该块所有窗口的视图
+            values = windows.reshape(-1, self.filter_height * self.filter_width)  # 每行为一个窗口的像素
+            result[top:top + rows] = np.partition(values, rank, axis=1)[:, rank].reshape(-1, self.image_width)  # 第rank个像素
+        return result
+
+    # 滑动直方图排序统计滤波（Perreault-Hébert）：每列维护窗口高度内的直方图，下移一行时每列只增删一个像素；
+    # 窗口直方图为相邻列直方图之和，由列方向前缀和相减得到，先在16个粗分组中定位，再在该分组的16个细分组中定位，代价与窗口大小无关
+    def rank_filtering(self, rank):
+
+        if self.filter_height * self.filter_width <= self.PARTITION_SIZE:  # 小窗口直接部分排序更快
+            return self.partition_filtering(rank)
+
+        row = lambda h: self.padded(h, h + 1)[0]  # 读取扩展后图像的第h行
+        columns, index = np.arange(self.padding_shape[1]), np.arange(self.image_width)  # 扩展后图像与结果矩阵的列序号
+        fine = np.zeros((256, self.padding_shape[1]), dtype=np.int32)  # 每列的细直方图，256个分组，按分组存储使前缀和沿连续内存进行
+        coarse = np.zeros((16, self.padding_shape[1]), dtype=np.int32)  # 每列的粗直方图，16个分组
+        fine_sum = np.zeros((256, self.padding_shape[1] + 1), dtype=np.int32)  # 细直方图的列方向前缀和，首列为零
+        coarse_sum = np.zeros((16, self.padding_shape[1] + 1), dtype=np.int32)  # 粗直方图的列方向前缀和，首列为零
+        result = np.empty(self.image_shape, dtype=int)  # 结果矩阵
+
+        for h in range(self.filter_height - 1):  # 列直方图先包含窗口的前filter_height - 1行
+            fine[row(h), columns] += 1  # 每列只有一个像素，索引不重复
+            coarse[row(h) >> 4, columns] += 1
+
+        for h in range(self.image_height):  # 逐行下移
+            bottom = row(h + self.filter_height - 1)  # 窗口最下方一行
+            fine[bottom, columns] += 1  # 加入窗口
+            coarse[bottom >> 4, columns] += 1
+
+            np.cumsum(coarse, axis=1, out=coarse_sum[:, 1:])  # 列方向前缀和
+            np.cumsum(fine, axis=1, out=fine_sum[:, 1:])
+            window = coarse_sum[:, self.filter_width:] - coarse_sum[:, :self.image_width]  # 每个窗口的粗直方图
+            cumulative = np.cumsum(window, axis=0)  # 粗直方图的累计计数
+            group = np.argmax(cumulative > rank, axis=0)  # 第rank个像素所在的粗分组
+            below = cumulative[group, index] - window[group, index]  # 该粗分组之前的像素数量
+            bins = 16 * group + np.arange(16)[:, np.newaxis]  # 该粗分组包含的细分组
+            window = fine_sum[bins, index + self.filter_width] - fine_sum[bins, index]  # 每个窗口在该粗分组内的细直方图
+            result[h] = 16 * group + np.argmax(below + np.cumsum(window, axis=0) > rank, axis=0)  # 第rank个像素的值
+
+            top = row(h)  # 窗口最上方一行
+            fine[top, columns] -= 1  # 移出窗口
+            coarse[top >> 4, columns] -= 1
+
+        return result
+
+    # 判断对象能否序列化，即能否传递给进程池
+    @staticmethod
+    def picklable(value):
+        try:
+            pickle.dumps(value)
+        except (pickle.PicklingError, AttributeError, TypeError):  # lambda、嵌套函数等无法序列化
+            return False
+        return True
+
+    # 逐窗口计算空间滤波函数，用于自定义滤波函数
+    def window_filtering(self, kernel):
+        windows = sliding_window_view(self.padded(), self.filter_shape)  # 所有窗口的视图
+        return np.array(
+            [
+                int(kernel(windows[h, w]))  # 计算空间滤波函数
+                for h in range(self.image_height) for w in range(self.image_width)  # 遍历图像矩阵
+            ],
+            dtype=int).reshape(self.image_shape)  # 生成空间滤波矩阵
 
     # 空间滤波算法
     def spatial_filtering(self, linear):
@@ -126,19 +459,22 @@ class ImageData:
         kernel = getattr(self, '%s_filter' % self.filter_mode.split('-')[0])()  # 生成空间滤波窗口（线性滤波）或空间滤波函数（非线性滤波）
 
         if linear:  # 线性滤波
-            self.filter_matrix = np.array(
-                [
-                    int(np.sum(kernel * self.padding_matrix[h:h + self.filter_height, w:w + self.filter_width]))  # 计算空间滤波窗口对应卷积
-                    for h in range(self.image_height) for w in range(self.image_width)  # 遍历图像矩阵
-                ],
-                dtype=int).reshape(self.image_shape)  # 生成空间滤波矩阵
-        else:  # 非线性滤波
-            self.filter_matrix = np.array(
-                [
-                    int(kernel(self.padding_matrix[h:h + self.filter_height, w:w + self.filter_width]))  # 计算空间滤波函数
-                    for h in range(self.image_height) for w in range(self.image_width)  # 遍历图像矩阵
-                ],
-                dtype=int).reshape(self.image_shape)  # 生成空间滤波矩阵
+            self.selected_method = self.select_method(kernel)  # 由整幅图像选择计算方式
+            self.filter_matrix = self.tiled('linear_filtering', kernel, self.selected_method)  # 生成空间滤波矩阵
+        elif self.filter_mode.split('-')[0] in ('median', 'percentile'):  # 排序统计滤波，使用滑动直方图
+            self.filter_matrix = self.tiled('rank_filtering', self.rank)  # 生成空间滤波矩阵
+        elif self.filter_mode.split('-')[0] in ('max', 'min', 'opening', 'closing', 'tophat'):  # 形态学滤波，使用van Herk/Gil-Werman算法
+            self.filter_matrix = self.morphology_filtering(kernel)  # 生成空间滤波矩阵
+            if self.filter_mode.split('-')[0] == 'tophat':  # 顶帽
+                self.filter_matrix = self.image_matrix - self.filter_matrix  # 原图减去开运算结果
+        elif self.filter_mode.split('-')[0] in ('prewitt', 'sobel', 'scharr'):  # 梯度滤波，如sobel、scharr-l1-orientation
+            options = self.filter_mode.split('-')[1:]  # 梯度幅值与方向选项
+            magnitude = next((option for option in options if option in ('l2', 'float32', 'l1')), 'l2')  # 梯度幅值的计算方式
+            self.filter_matrix, self.gradient_orientation = self.tiled(
+                'gradient', kernel, magnitude, 'orientation' in options, attributes=('gradient_x', 'gradient_y')
+            )  # 生成空间滤波矩阵与梯度方向
+        else:  # 自定义滤波（custom），逐像素调用Python函数，可序列化时使用进程池，否则（如lambda、嵌套函数）退回线程池
+            self.filter_matrix = self.tiled('window_filtering', kernel, processes=self.picklable(kernel))  # 生成空间滤波矩阵
 
         if linear and self.processing_mode == 'sharpening':  # 线性锐化算法
             if self.filter_mode.split('-')[0] == 'highboost':  # 钝化或高提升滤波
@@ -156,6 +492,16 @@ class ImageData:
             self.filter_shape = (G, G) if G % 2 else (G + 1, G + 1)  # 保证滤波器边长为奇数
         elif filter_mode.split('-')[0] == 'box':  # 均值滤波器
             self.filter_shape = tuple(map(int, filter_mode.split('-')[1:]))
+        elif filter_mode.split('-')[0] in ('median', 'percentile'):  # 排序统计滤波器，如median-5-5、percentile-25-7-7
+            sizes = tuple(map(int, filter_mode.split('-')[1 if filter_mode.startswith('median') else 2:]))  # 窗口尺寸，默认为3*3
+            self.filter_shape = sizes if len(sizes) == 2 else (3, 3)
+            if self.filter_shape[0] % 2 == 0 or self.filter_shape[1] % 2 == 0:  # 窗口边长需为奇数
+                raise ValueError('Window size of %s filter must be odd' % filter_mode)
+            self.percentile = float(filter_mode.split('-')[1]) if filter_mode.startswith('percentile') else 50.0  # 百分位数
+            self.rank = int(np.round(self.percentile / 100 * (np.prod(self.filter_shape) - 1)))  # 对应的排序序号，从0开始
+        elif filter_mode.split('-')[0] in ('max', 'min', 'opening', 'closing', 'tophat', 'custom'):  # 形态学或自定义滤波器，如max-15-15、tophat-31-31、custom-5-5
+            sizes = tuple(map(int, filter_mode.split('-')[1:]))  # 窗口尺寸，默认为3*3
+            self.filter_shape = sizes if len(sizes) == 2 else (3, 3)
         elif filter_mode.split('-')[0] == 'highboost':  # 高提升滤波器
             self.sigma = 3  # 标准差
             self.filter_shape = (19, 19)  # 设定滤波器边长为19
@@ -175,7 +521,7 @@ class ImageData:
         self.filter_mode = filter_mode  # 设定滤波模式
         self.set_filter_shape(filter_mode)  # 设定滤波器尺寸
 
-        self.padding()  # 生成扩展矩阵
+        self.padding()  # 生成扩展序号
         self.spatial_filtering(linear)  # 生成空间滤波矩阵
 
         self.output_image()  # 输出图像
@@ -191,6 +537,34 @@ class ImageData:
                 print('Processing mode: %s & %s padding & %s filter' % (processing_mode, padding_mode, filter_mode))  # 测试模式
                 print('Program execute time: %.2f s\n' % (end - start))  # 测试时长
 
+    # 并行扩展性测试：使用不同数量的线程（进程）处理同一幅图像，显示吞吐量与相对单线程的加速比
+    def scaling(self, linear, processing_mode, padding_mode, filter_mode, workers=None):
+        cpu_count = os.cpu_count() or 1  # 处理器核心数
+        workers = workers or sorted({2**i for i in range(cpu_count.bit_length())} | {cpu_count})  # 默认为1、2、4……直至核心数
+        default_workers = self.workers  # 暂存线程（进程）数量
+
+        self.input_image()  # 输入图像
+        self.processing_mode, self.padding_mode, self.filter_mode = processing_mode, padding_mode, filter_mode  # 设定处理、扩展与滤波模式
+        self.set_filter_shape(filter_mode)  # 设定滤波器尺寸
+        self.padding()  # 生成扩展序号
+
+        print('\nImage: %s, %s padding & %s filter, %d cores\n' % (self.image_name, padding_mode, filter_mode, cpu_count))  # 测试模式
+        single = None  # 单线程的执行时间
+        for count in workers:  # 线程（进程）数量
+            self.workers = count
+            start = time.time()  # 开始测试时刻
+            self.spatial_filtering(linear)  # 生成空间滤波矩阵
+            end = time.time()  # 结束测试时刻
+            single = single or end - start
+            print('Workers: %2d, throughput: %7.2f Mpixel/s, speedup: %.2fx' % (self.workers, self.image_size / (end - start) / 1e6, single / (end - start)))
+
+        self.workers = default_workers  # 恢复线程（进程）数量
+
+
+# 自定义空间滤波函数示例：局部标准差，反映窗口内的对比度；定义在模块级以便传递给进程池
+def local_deviation(window):
+    return np.std(window)
+
 
 if __name__ == '__main__':
 
@@ -210,4 +584,11 @@ if __name__ == '__main__':
     ImageData('text.tif').test(linear=True, processing_mode='sharpening', filters=['highboost-1', 'highboost-4.5'])
 
     # 图像: lens.tif，模式：非线性锐化，滤波器：普鲁伊特、索伯
-    ImageData('lens.tif').test(linear=False, processing_mode='sharpening', filters=['prewitt', 'sobel'])
\ No newline at end of file
+    ImageData('lens.tif').test(linear=False, processing_mode='sharpening', filters=['prewitt', 'sobel'])
+
+    # 图像: test_pattern.tif，并行扩展性：高斯（标准差：8）、中值（滤波器尺寸：15*15）
+    ImageData('test_pattern.tif').scaling(linear=True, processing_mode='smoothing', padding_mode='mirror', filter_mode='gaussian-8')
+    ImageData('test_pattern.tif').scaling(linear=False, processing_mode='smoothing', padding_mode='mirror', filter_mode='median-15-15')
+
+    # 图像: circuit_board.tif，模式：非线性平滑，滤波器：自定义局部标准差（滤波器尺寸：5*5）
+    ImageData('circuit_board.tif', kernel=local_deviation).test(linear=False, processing_mode='smoothing', filters=['custom-5-5'])
\ No newline at end of file
@@ -47,27 +47,28 @@ class ImageData:
         image_splice.save(self.image_name.replace('.', '_') + '_' + self.processing_mode + '_by_' + self.filter_mode + '_filter_using_' + self.padding_mode + '_padding.png')  # 保存图像
         # image_splice.show()  # 运行程序时显示图像
 
-    # 零扩展
-    def zero_padding(self):
-        pass  # 原扩展矩阵为零矩阵，不需要额外处理
-
-    # 镜面扩展
-    def mirror_padding(self):
-        self.padding_matrix[self.image_height:, self.image_width:] = np.rot90(self.image_matrix, 2)  # 右下方
-        self.padding_matrix[self.image_height:, :self.image_width] = np.flipud(self.image_matrix)  # 下方
-        self.padding_matrix[:self.image_height, self.image_width:] = np.fliplr(self.image_matrix)  # 右方
-
-    # 复制扩展
-    def replicate_padding(self):
-        self.padding_matrix[self.image_height:, self.image_width:] = self.image_matrix[-1, -1]  # 右下方
-        self.padding_matrix[self.image_height:, :self.image_width] = self.image_matrix[-2:-1, :]  # 下方
-        self.padding_matrix[:self.image_height, self.image_width:] = self.image_matrix[:, -2:-1]  # 右方
-
-    # 扩展算法
+    # 零扩展：扩展区域由傅里叶变换补零，只映射原图像部分
+    def zero_padding(self, index, length):
+        return index[:length]
+
+    # 镜面扩展：以图像边界为轴对称
+    def mirror_padding(self, index, length):
+        return np.where(index < length, index, 2 * length - 1 - index)
+
+    # 复制扩展：扩展区域取最后一行、最后一列
+    def replicate_padding(self, index, length):
+        return np.minimum(index, length - 1)
+
+    # 扩展算法：不生成扩展矩阵，只记录扩展后每行、每列对应的原图像行列序号
     def padding(self):
-        self.padding_matrix = np.zeros(2 * np.array(self.image_shape))  # 生成扩展矩阵
-        self.padding_matrix[:self.image_height, :self.image_width] = self.image_matrix  # 将原图像复制至扩展矩阵左上角
-        getattr(self, '%s_padding' % self.padding_mode)()  # 对原图像进行扩展
+        self.row_index = getattr(self, '%s_padding' % self.padding_mode)(np.arange(2 * self.image_height), self.image_height)  # 扩展后每行对应的原图像行
+        self.column_index = getattr(self, '%s_padding' % self.padding_mode)(np.arange(2 * self.image_width), self.image_width)  # 扩展后每列对应的原图像列
+
+    # 读取扩展后的图像：只包含原图像时直接返回原图像，不复制数据，否则按行列序号映射读取
+    def padded(self):
+        if (len(self.row_index), len(self.column_index)) == self.image_shape:  # 零扩展
+            return self.image_matrix
+        return self.image_matrix[np.ix_(self.row_index, self.column_index)]  # 8位扩展图像
 
     # 理想低通滤波器
     def ideal_lowpass_filter(self, args):
@@ -131,7 +132,7 @@ class ImageData:
 
         # 频域滤波五步骤
         self.padding()  # 第一步：扩展图像
-        self.pre_frequency = np.fft.fft2(self.centerize(self.padding_matrix))  # 第二步：计算傅里叶变换
+        self.pre_frequency = np.fft.fft2(self.centerize(self.padded()), s=2 * np.array(self.image_shape))  # 第二步：计算傅里叶变换，不足部分补零
         self.post_frequency = getattr(self, '%s_filter' % self.filter_mode.split('-')[0])(self.filter_mode.split('-')[1:]) * self.pre_frequency  # 第三步：计算频域滤波矩阵
         result = self.centerize(np.real(np.fft.ifft2(self.post_frequency))).astype(int)  # 第四步：计算傅里叶逆变换
         self.result_matrix = result[:self.image_height, :self.image_width]  # 第五步：提取图像
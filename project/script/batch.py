@@ -0,0 +1,133 @@
+import argparse  # 命令行操作
+import csv  # 表格操作
+import os  # 文件操作
+import time  # 时间操作
+import traceback  # 异常操作
+from concurrent.futures import ProcessPoolExecutor  # 并行操作
+
+from PIL import Image  # 图像操作
+
+from main import GUI, Transform  # 图像变换器
+
+
+class BatchWarper:
+    '''无界面批量图像变换器，使用进程池并行执行任务'''
+
+    # 常量
+    TIMING_FIELDS = ('job', 'status', 'solve', 'field', 'resample', 'tile', 'total', 'output', 'error')  # 计时文件的表头
+
+    # 初始化
+    def __init__(
+        self, output_dir, workers=None, algorithm='TPS', interpolation='bicubic', tolerance=None, smoothing=0.0, tile=None, support=None,
+        mls_mode='affine', precision='float64'
+    ):
+        self.output_dir = output_dir  # 结果图像与计时文件的输出目录
+        self.workers = workers or os.cpu_count() or 1  # 进程池的进程数量，默认为处理器核心数
+        self.options = {
+            'algorithm': algorithm,  # 默认图像形变算法，任务未指定时使用
+            'interpolation': interpolation,  # 插值方式
+            'tolerance': tolerance,  # 形变场近似的容差，为None时逐像素精确计算
+            'smoothing': smoothing,  # TPS的平滑参数
+            'support': support,  # CSRBF的支撑半径，为None时自动确定
+            'mls_mode': mls_mode,  # MLS的变换类型
+            'precision': precision,  # 形变场的精度
+            'tile': tile  # 分块变换的分块边长，为None时整幅变换并保存为png，否则以内存映射方式分块变换并保存为npy
+        }  # 所有任务共用的变换参数
+
+    # 从CSV文件读取任务列表，列为original、reference、landmarks，可选列为algorithm、output，相对路径以CSV文件所在目录为基准
+    def read_job_file(self, job_path):
+        base_dir = os.path.dirname(os.path.abspath(job_path))  # CSV文件所在目录
+        with open(job_path, newline='') as job_file:
+            rows = list(csv.DictReader(job_file))  # 按表头读取每一行
+        jobs = []  # 任务列表
+        for i, row in enumerate(rows, 1):  # 遍历每一行
+            name = os.path.splitext(row.get('output') or 'job_%d' % i)[0]  # 任务名称
+            jobs.append(dict(
+                self.options,
+                name=os.path.basename(name),
+                original=os.path.join(base_dir, row['original']),
+                reference=os.path.join(base_dir, row['reference']),
+                landmarks=os.path.join(base_dir, row['landmarks']),
+                algorithm=row.get('algorithm') or self.options['algorithm']
+            ))
+        return jobs
+
+    # 从目录读取任务列表，每个子目录为一个任务，包含original.*、reference.*与landmarks.csv
+    def read_job_dir(self, job_dir):
+        jobs = []  # 任务列表
+        for name in sorted(os.listdir(job_dir)):  # 遍历子目录
+            sub_dir = os.path.join(job_dir, name)  # 子目录路径
+            if not os.path.isdir(sub_dir):  # 跳过文件
+                continue
+            files = {os.path.splitext(f)[0]: f for f in os.listdir(sub_dir) if f.lower().endswith(GUI.IMAGE_SUFFIX)}  # 子目录中的图像文件
+            if 'original' not in files or 'reference' not in files:  # 缺少图像时跳过
+                continue
+            jobs.append(dict(
+                self.options,
+                name=name,
+                original=os.path.join(sub_dir, files['original']),
+                reference=os.path.join(sub_dir, files['reference']),
+                landmarks=os.path.join(sub_dir, 'landmarks.csv')
+            ))
+        return jobs
+
+    # 执行单个任务，在子进程中运行，返回计时记录
+    @staticmethod
+    def execute_job(job, output_dir):
+        suffix = '.npy' if job['tile'] else '.png'  # 分块变换的结果保存为内存映射的npy文件
+        record = {'job': job['name'], 'status': 'done', 'output': os.path.join(output_dir, job['name'] + suffix)}  # 计时记录
+        start = time.perf_counter()  # 任务开始时刻
+        try:
+            deformer = Transform(
+                Transform.open_image_matrix(job['original']) if job['tile'] else Image.open(job['original']),  # 分块变换时按需读取原始图像
+                Image.open(job['reference']), Transform.load_landmarks(job['landmarks']), job['algorithm'],
+                interpolation=job['interpolation'], workers=1,  # 进程间已经并行，进程内使用单线程避免超额占用处理器
+                field_step=8 if job['tolerance'] else 1, field_tolerance=job['tolerance'], smoothing=job['smoothing'],
+                support=job['support'], mls_mode=job['mls_mode'], precision=job['precision']
+            )  # 全分辨率图像变换器
+            if job['tile']:  # 分块执行空间变换，结果直接写入文件
+                deformer.tiled_transform(record['output'], job['tile'])
+            else:  # 整幅执行空间变换并保存结果图像
+                record['output'] = Transform.save_image(deformer.spatial_transform(), record['output'])  # 16位RGB结果保存为npy
+            record.update({stage: '%.4f' % seconds for stage, seconds in deformer.execute_time.items()})  # 各阶段的执行时间
+        except Exception:  # 任务出错时记录错误，不影响其他任务
+            record.update(status='failed', output='', error=traceback.format_exc(limit=1).strip().splitlines()[-1])
+        record['total'] = '%.4f' % (time.perf_counter() - start)  # 任务的总执行时间
+        return record
+
+    # 使用进程池执行所有任务，按任务顺序写入计时文件
+    def run(self, jobs):
+        os.makedirs(self.output_dir, exist_ok=True)  # 新建输出目录
+        timing_path = os.path.join(self.output_dir, 'timing.csv')  # 计时文件路径
+        with open(timing_path, 'w', newline='') as timing_file, ProcessPoolExecutor(max_workers=self.workers) as executor:
+            writer = csv.DictWriter(timing_file, fieldnames=self.TIMING_FIELDS)
+            writer.writeheader()  # 表头
+            for i, record in enumerate(executor.map(self.execute_job, jobs, [self.output_dir] * len(jobs)), 1):  # 并行执行任务
+                writer.writerow(record)  # 写入计时记录
+                timing_file.flush()  # 及时写入文件，中断时保留已完成的记录
+                print('[%d/%d] %s: %s (%s s)' % (i, len(jobs), record['job'], record['status'], record['total']))  # 显示任务进度
+        return timing_path
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Warp image pairs in batch without GUI.')  # 命令行参数
+    parser.add_argument('jobs', help='CSV job list (original, reference, landmarks[, algorithm, output]) or a directory of job folders')
+    parser.add_argument('-o', '--output', default='output', help='output directory for resultant images and timing.csv')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='number of worker processes (default: CPU count)')
+    parser.add_argument('-a', '--algorithm', default='TPS', help='default transform algorithm (default: TPS)')
+    parser.add_argument('-i', '--interpolation', default='bicubic', choices=('nearest', 'bilinear', 'bicubic', 'lanczos'))
+    parser.add_argument('-t', '--tolerance', type=float, default=None, help='coarse-grid field checkpoint tolerance in pixels (default: exact)')
+    parser.add_argument('-s', '--smoothing', type=float, default=0.0, help='TPS smoothing parameter (default: 0)')
+    parser.add_argument('-r', '--support', type=float, default=None, help='CSRBF support radius in pixels (default: automatic)')
+    parser.add_argument('-m', '--mls-mode', default='affine', choices=('affine', 'similarity', 'rigid'), help='MLS transform type')
+    parser.add_argument('-p', '--precision', default='float64', choices=('float32', 'float64'), help='deformation field precision')
+    parser.add_argument('-T', '--tile', type=int, default=None, help='tile size for out-of-core warping to .npy (default: whole image)')
+    args = parser.parse_args()
+
+    warper = BatchWarper(
+        args.output, args.workers, args.algorithm, args.interpolation, args.tolerance, args.smoothing, args.tile, args.support,
+        args.mls_mode, args.precision
+    )  # 批量图像变换器
+    jobs = warper.read_job_dir(args.jobs) if os.path.isdir(args.jobs) else warper.read_job_file(args.jobs)  # 读取任务列表
+    print('Timing: %s' % warper.run(jobs))  # 执行所有任务
@@ -0,0 +1,158 @@
+import argparse  # 命令行操作
+import json  # 数据操作
+import os  # 系统操作
+import platform  # 平台信息
+import sys  # 系统操作
+import time  # 时间操作
+import tracemalloc  # 内存操作
+from itertools import product  # 迭代操作
+
+import numpy as np  # 数组操作
+
+from main import Transform  # 图像变换器
+
+
+class WarpBenchmark:
+    '''图像变换基准测试，使用合成图像与固定随机种子的映射坐标点，记录各阶段的执行时间与峰值内存'''
+
+    # 常量
+    SIZES = (256, 512, 1024, 2048, 4096)  # 默认的图像边长
+    LANDMARKS = (3, 10, 100, 500, 2000)  # 默认的映射坐标点数量
+    ALGORITHMS = ('TPS', 'LARM', 'CSRBF', 'MLS')  # 默认的图像形变算法
+    INTERPOLATIONS = ('bilinear', 'bicubic')  # 默认的插值方式
+    STAGES = ('solve', 'field', 'resample')  # 记录执行时间的阶段
+    DENSE = ('TPS', 'LARM', 'MLS')  # 每个像素与所有映射坐标点相关的算法，计算量为像素数量*映射坐标点数量
+
+    # 初始化
+    def __init__(self, seed=0, repeat=1, workers=None, max_work=2e10, precision='float64'):
+        self.seed = seed  # 随机种子
+        self.repeat = repeat  # 每组参数的重复次数，各阶段取最短时间
+        self.workers = workers  # 每次变换的线程数量，默认为处理器核心数
+        self.max_work = max_work  # 稠密算法的像素数量*映射坐标点数量上限，超过时跳过
+        self.precision = precision  # 形变场的精度
+
+    # 合成图像：平滑的正弦纹理叠加噪声，三通道uint8
+    def synthetic_image(self, size):
+        rng = np.random.default_rng(self.seed)  # 随机数生成器
+        row, column = np.ogrid[:size, :size]  # 坐标网格
+        texture = 127 + 50 * np.sin(column / 13) * np.cos(row / 17)  # 平滑纹理
+        channels = [texture + 20 * np.sin((row + column) / (5 + 3 * c)) for c in range(3)]  # 各通道的纹理
+        image = np.stack(channels, axis=-1) + rng.normal(0, 8, (size, size, 3))  # 叠加噪声
+        return np.clip(image, 0, 255).astype(np.uint8)
+
+    # 映射坐标点：参考图像坐标均匀分布，原始图像坐标为参考图像坐标加上约1%图像边长的随机位移
+    def synthetic_mapping(self, size, number):
+        rng = np.random.default_rng(self.seed + number)  # 随机数生成器，与映射坐标点数量相关以保证可复现
+        reference = rng.uniform(0, size - 1, (number, 2))  # 参考图像坐标
+        original = reference + rng.normal(0, 0.01 * size, (number, 2))  # 原始图像坐标
+        return {tuple(r): tuple(o) for r, o in zip(reference.tolist(), original.tolist())}
+
+    # 执行一次变换，返回图像变换器
+    def transform(self, image, mapping, algorithm, interpolation):
+        deformer = Transform(
+            image, image, mapping, algorithm, interpolation=interpolation, workers=self.workers, precision=self.precision
+        )  # 图像变换器
+        deformer.spatial_transform()  # 执行空间变换
+        return deformer
+
+    # 执行两次变换，返回各阶段的执行时间与峰值内存；跟踪内存分配会拖慢每次分配，因此计时的变换不跟踪，峰值内存由另一次变换测量
+    def measure(self, image, mapping, algorithm, interpolation):
+        start = time.perf_counter()  # 变换开始时刻
+        deformer = self.transform(image, mapping, algorithm, interpolation)  # 计时的变换
+        total = time.perf_counter() - start  # 总执行时间
+        tracemalloc.start()  # 开始跟踪内存分配，NumPy数组的内存同样被跟踪
+        try:
+            self.transform(image, mapping, algorithm, interpolation)  # 测量内存的变换
+            _, peak = tracemalloc.get_traced_memory()  # 峰值内存
+        finally:
+            tracemalloc.stop()  # 停止跟踪
+        record = {stage: deformer.execute_time.get(stage, 0.0) for stage in self.STAGES}  # 各阶段的执行时间
+        record.update(total=total, peak_mb=peak / 2**20)
+        return record
+
+    # 遍历所有参数组合，返回测试记录
+    def run(self, sizes, landmarks, algorithms, interpolations):
+        runs = []  # 测试记录
+        for size in sizes:  # 遍历图像边长
+            image = self.synthetic_image(size)  # 合成图像
+            for number, algorithm, interpolation in product(landmarks, algorithms, interpolations):  # 遍历其他参数
+                run = {'size': size, 'landmarks': number, 'algorithm': algorithm, 'interpolation': interpolation}  # 测试记录
+                if algorithm in self.DENSE and size * size * number > self.max_work:  # 计算量过大
+                    run['status'] = 'skipped'
+                else:
+                    mapping = self.synthetic_mapping(size, number)  # 映射坐标点
+                    records = [self.measure(image, mapping, algorithm, interpolation) for _ in range(self.repeat)]  # 重复测试
+                    run.update({key: min(record[key] for record in records) for key in records[0]}, status='done')  # 各项取最小值
+                runs.append(run)
+                print(self.format_run(run))  # 显示测试结果
+        return {'environment': self.environment(), 'seed': self.seed, 'repeat': self.repeat, 'precision': self.precision, 'runs': runs}
+
+    # 运行环境信息
+    @staticmethod
+    def environment():
+        return {
+            'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+            'processor': platform.processor(), 'cpu_count': os.cpu_count()
+        }
+
+    # 测试记录的键，用于与基准结果对应
+    @staticmethod
+    def run_key(run):
+        return run['size'], run['landmarks'], run['algorithm'], run['interpolation']
+
+    # 格式化一条测试记录
+    @classmethod
+    def format_run(cls, run):
+        name = '%5d px %5d pts %-6s %-8s' % cls.run_key(run)  # 参数
+        if run['status'] != 'done':  # 未执行
+            return '%s  %s' % (name, run['status'])
+        stages = '  '.join('%s %8.3f s' % (stage, run[stage]) for stage in cls.STAGES)  # 各阶段的执行时间
+        return '%s  %s  total %8.3f s  peak %8.1f MB' % (name, stages, run['total'], run['peak_mb'])
+
+    # 与基准结果比较，执行时间或峰值内存增加超过阈值比例（且超过最小绝对差）的项目视为性能退化
+    @classmethod
+    def compare(cls, result, baseline, threshold=0.2, min_seconds=0.05):
+        previous = {cls.run_key(run): run for run in baseline['runs'] if run['status'] == 'done'}  # 基准结果
+        regressions = []  # 性能退化的项目
+        for run in result['runs']:  # 遍历本次测试记录
+            old = previous.get(cls.run_key(run))  # 对应的基准记录
+            if old is None or run['status'] != 'done':  # 无法比较
+                continue
+            for key in cls.STAGES + ('total', 'peak_mb'):  # 遍历比较项目
+                floor = min_seconds if key != 'peak_mb' else 1.0  # 最小绝对差，忽略测量噪声
+                if run[key] > old[key] * (1 + threshold) and run[key] - old[key] > floor:  # 性能退化
+                    regressions.append((run, key, old[key], run[key]))
+        return regressions
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Benchmark warp algorithms on synthetic images.')  # 命令行参数
+    parser.add_argument('-s', '--sizes', type=int, nargs='+', default=WarpBenchmark.SIZES, help='image side lengths')
+    parser.add_argument('-n', '--landmarks', type=int, nargs='+', default=WarpBenchmark.LANDMARKS, help='landmark counts')
+    parser.add_argument('-a', '--algorithms', nargs='+', default=WarpBenchmark.ALGORITHMS, help='transform algorithms')
+    parser.add_argument('-i', '--interpolations', nargs='+', default=WarpBenchmark.INTERPOLATIONS,
+                        choices=('nearest', 'bilinear', 'bicubic', 'lanczos'), help='resampling methods')
+    parser.add_argument('-r', '--repeat', type=int, default=1, help='repetitions per configuration, best time is kept')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='threads per transform (default: CPU count)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for images and landmarks')
+    parser.add_argument('--max-work', type=float, default=2e10, help='skip dense algorithms above pixels * landmarks')
+    parser.add_argument('-p', '--precision', default='float64', choices=('float32', 'float64'), help='deformation field precision')
+    parser.add_argument('-o', '--output', default='benchmark.json', help='JSON file for the results')
+    parser.add_argument('-b', '--baseline', default=None, help='JSON file of a previous run to compare against')
+    parser.add_argument('-t', '--threshold', type=float, default=0.2, help='relative slowdown flagged as a regression')
+    args = parser.parse_args()
+
+    benchmark = WarpBenchmark(args.seed, args.repeat, args.workers, args.max_work, args.precision)  # 基准测试
+    result = benchmark.run(args.sizes, args.landmarks, args.algorithms, args.interpolations)  # 执行所有测试
+    with open(args.output, 'w') as output_file:
+        json.dump(result, output_file, indent=2)  # 写入测试结果
+    print('Results: %s' % args.output)
+
+    if args.baseline:  # 与基准结果比较
+        with open(args.baseline) as baseline_file:
+            regressions = WarpBenchmark.compare(result, json.load(baseline_file), args.threshold)  # 性能退化的项目
+        for run, key, old, new in regressions:  # 显示性能退化的项目
+            print('REGRESSION %d px %d pts %s %s: ' % WarpBenchmark.run_key(run) + '%s %.3f -> %.3f' % (key, old, new))
+        print('%d regression(s) against %s' % (len(regressions), args.baseline))
+        sys.exit(1 if regressions else 0)  # 存在性能退化时返回非零状态码
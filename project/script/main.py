@@ -1,12 +1,23 @@
+import csv  # 表格操作
+import hashlib  # 哈希操作
+import os  # 系统操作
+import queue  # 队列操作
 import subprocess  # 文件操作
+import sys  # 系统操作
+import tempfile  # 文件操作
+import threading  # 线程操作
 import time  # 时间操作
+import warnings  # 警告操作
 import tkinter as tk  # 界面操作
-from itertools import product  # 网格操作
-from tkinter import filedialog, messagebox  # 交互操作
+from concurrent.futures import ThreadPoolExecutor  # 并行操作
+from tkinter import filedialog, messagebox, simpledialog  # 交互操作
 
 import numpy as np  # 数组操作
 from PIL import Image, ImageTk  # 图像操作
-from scipy.interpolate import griddata  # 插值操作
+from scipy.linalg import LinAlgWarning, lu_factor, lu_solve  # 矩阵分解操作
+from scipy.sparse import coo_matrix, identity  # 稀疏矩阵操作
+from scipy.sparse.linalg import splu  # 稀疏矩阵分解操作
+from scipy.spatial import cKDTree  # 近邻搜索操作
 
 
 class GUI:
@@ -19,6 +30,7 @@ class GUI:
 
     # 常量
     IMAGE_SUFFIX = ('.tif', '.tiff', '.jpg', '.jpeg', '.png', '.gif', 'bmp')  # 图像文件的后缀名
+    APPLICATION_DIR = os.path.dirname(os.path.abspath(sys.executable if getattr(sys, 'frozen', False) else __file__))  # 可执行文件（打包后）或脚本所在的目录
 
     # 初始化
     def __init__(self):
@@ -34,6 +46,9 @@ class GUI:
         self.reference_image = None  # 参考图像，格式为PIL.Image.Image
         self.resultant_image = None  # 结果图像，格式为PIL.Image.Image
 
+        self.original_image_path = None  # 原始图像的文件路径，导出全分辨率结果时读取源图像
+        self.reference_image_path = None  # 参考图像的文件路径
+
         self.original_landmarks = dict()  # 原始图像的映射坐标点，键表示序号，值表示二维坐标
         self.reference_landmarks = dict()  # 参考图像的映射坐标点，键表示序号，值表示二维坐标
 
@@ -41,7 +56,22 @@ class GUI:
         self.reference_landmarks_number = 0  # 参考图像的映射坐标点的数量
 
         self.transform_algorithm = 'TPS'  # 图像形变算法，默认为薄板样条形变算法
+        self.transform_interpolation = tk.StringVar(value='bicubic')  # 反向变换的插值方式，默认为双三次插值
+        self.transform_smoothing = 0.0  # TPS算法的平滑参数λ，默认为0即精确插值
+        self.transform_support = 0.0  # CSRBF算法的支撑半径（像素），默认为0即根据映射坐标点的间距自动确定
+        self.transform_tolerance = 0.0  # 粗网格近似形变场的容差（像素），默认为0即逐像素精确计算
+        self.tps_solver = TPSSolver(np.zeros((0, 2)), np.zeros((0, 2)))  # 在多次变换之间复用的TPS求解器，编辑映射坐标点后增量更新
+        self.mls_mode = 'affine'  # MLS算法的变换类型，默认为仿射变换
+        self.mls_deformer = MLSDeformer()  # 在多次变换之间复用的MLS形变器，只移动原始图像的映射坐标点时复用预计算表
+        self.field_cache = FieldCache(os.path.join(self.APPLICATION_DIR, 'cache'))  # 形变场的磁盘缓存，位于可执行文件旁而与工作目录无关，映射坐标点与图像尺寸未变时直接读取
         self.transform_execute_time = tk.StringVar()  # 执行图像空间变换所需时间的变量
+        self.transform_thread = None  # 在后台执行图像空间变换的线程
+        self.transform_queue = queue.Queue()  # 后台线程向主线程传递进度与结果的消息队列
+        self.transform_cancel_event = threading.Event()  # 取消图像空间变换的事件
+
+        self.field_float32 = tk.BooleanVar(value=False)  # 是否以float32保存形变场，内存与带宽减半
+        self.live_preview = tk.BooleanVar(value=False)  # 是否在编辑映射坐标点时实时预览结果图像
+        self.preview_job = None  # 等待执行的预览任务，用于去抖动
 
 
     #############
@@ -53,8 +83,64 @@ class GUI:
         if self.resultant_image is None:  # 未生成结果图像
             messagebox.showwarning('Warning', 'No Resultant Image!')  # 弹出警告框提示无结果图像
         else:  # 已生成结果图像
-            resultant_image_path = filedialog.asksaveasfilename(title='Save Resultant Image')  # 弹出对话框询问保存文件的位置与名称
-            self.resultant_image.save(resultant_image_path + '.png')  # 保存结果图像，格式为png
+            resultant_image_path = filedialog.asksaveasfilename(title='Save Resultant Image', defaultextension='.png')  # 弹出对话框询问保存文件的位置与名称
+            if resultant_image_path == '':  # 点按了取消或者关闭
+                return
+            saved_path = Transform.save_image(np.asarray(self.resultant_image), resultant_image_path)  # 保存结果图像，浮点等格式无法表示的图像保存为.npy
+            if saved_path != resultant_image_path:  # 结果图像未能以所选格式保存
+                messagebox.showinfo('Save', 'Resultant image saved as %s' % saved_path)  # 弹出信息框提示实际保存的位置
+
+    # 文件操作：在源图像的全分辨率上分块执行空间变换，结果保存为内存映射的.npy文件
+    def export_full_resolution(self):
+        if not self.check_landmarks():  # 图像或映射坐标点不满足变换条件
+            return
+        if self.transform_thread is not None and self.transform_thread.is_alive():  # 正在执行空间变换
+            messagebox.showwarning('Warning', 'Transform is running!')  # 弹出警告框提示正在变换
+            return
+        output_path = filedialog.asksaveasfilename(title='Export Full Resolution', defaultextension='.npy')  # 弹出对话框询问保存文件的位置与名称
+        if output_path == '':  # 点按了取消或者关闭
+            return
+        self.transform_cancel_event.clear()  # 重置取消事件
+        options = {
+            'interpolation': self.transform_interpolation.get(), 'smoothing': self.transform_smoothing,
+            'support': self.transform_support or None, 'mls_mode': self.mls_mode,
+            'precision': 'float32' if self.field_float32.get() else 'float64',  # 形变场的精度
+            'field_step': 8 if self.transform_tolerance > 0 else 1, 'field_tolerance': self.transform_tolerance or None
+        }  # 变换参数，Tk变量只能在主线程中读取
+        self.transform_thread = threading.Thread(
+            target=self.execute_export, args=(output_path, self.source_mapping(), self.transform_algorithm, options), daemon=True
+        )  # 后台线程
+        self.transform_thread.start()  # 开始执行分块变换
+        self.transform_button.config(text='Cancel', command=self.cancel_transform)  # 变换过程中按钮用于取消
+        self.window.after(50, self.poll_transform)  # 轮询后台线程的消息
+
+    # 文件操作：保存映射坐标点为文件
+    def save_landmarks(self):
+        if self.original_landmarks_number == 0 or self.original_landmarks_number != self.reference_landmarks_number:  # 映射坐标点未配对
+            messagebox.showwarning('Warning', 'No paired landmarks!')  # 弹出警告框提示无配对的映射坐标点
+            return
+        landmarks_path = filedialog.asksaveasfilename(title='Save Landmarks', defaultextension='.csv')  # 弹出对话框询问保存文件的位置与名称
+        if landmarks_path != '':  # 未点按取消或者关闭
+            Transform.save_landmarks(landmarks_path, self.landmark_mapping())  # 保存映射坐标点
+
+    # 文件操作：从文件读取映射坐标点
+    def load_landmarks(self):
+        if self.original_image is None or self.reference_image is None:  # 未打开原始图像或参考图像
+            messagebox.showerror('Error', 'No original image or reference image!')  # 弹出错误框告示未打开原始图像或参考图像
+            return
+        landmarks_path = filedialog.askopenfilename(title='Load Landmarks', filetypes=[('CSV', '.csv'), ('All', '*')])  # 弹出对话框询问文件的位置与名称
+        if landmarks_path == '':  # 点按了取消或者关闭
+            return
+        try:
+            mapping = Transform.load_landmarks(landmarks_path)  # 读取映射关系
+        except (OSError, KeyError, ValueError):  # 文件无法读取或格式错误
+            messagebox.showerror('Error', 'Wrong Landmarks Format!')  # 弹出错误框告示文件格式错误
+            return
+        self.delete_all_original_landmarks()  # 删除原有的映射坐标点
+        self.delete_all_reference_landmarks()
+        for (ref_y, ref_x), (ori_y, ori_x) in mapping.items():  # 遍历映射关系
+            self.add_original_landmark(ori_x, ori_y)  # 标记原始图像的映射坐标点，放大后标记的亚像素坐标得以保留
+            self.add_reference_landmark(ref_x, ref_y)  # 标记参考图像的映射坐标点
 
     # 文件操作：退出交互界面
     def quit_program(self):
@@ -64,10 +150,52 @@ class GUI:
     # 算法操作：将算法设置为TPS算法
     def set_algorithm_to_TPS(self):
         self.transform_algorithm = 'TPS'  # 设置图像形变算法为TPS算法
+        self.schedule_preview()  # 刷新实时预览
 
     # 算法操作：将算法设置为LARM算法
     def set_algorithm_to_LARM(self):
         self.transform_algorithm = 'LARM'  # 设置图像形变算法为LARM算法
+        self.schedule_preview()  # 刷新实时预览
+
+    # 算法操作：将算法设置为CSRBF算法
+    def set_algorithm_to_CSRBF(self):
+        self.transform_algorithm = 'CSRBF'  # 设置图像形变算法为CSRBF算法
+        self.schedule_preview()  # 刷新实时预览
+
+    # 算法操作：将算法设置为MLS算法，变换类型为affine、similarity或rigid
+    def set_algorithm_to_MLS(self, mode):
+        self.transform_algorithm = 'MLS'  # 设置图像形变算法为MLS算法
+        self.mls_mode = mode  # 设置变换类型
+        self.schedule_preview()  # 刷新实时预览
+
+    # 算法操作：设置TPS算法的平滑参数
+    def set_TPS_smoothing(self):
+        smoothing = simpledialog.askfloat(
+            'TPS Smoothing', 'Smoothing parameter (0 for exact interpolation):',
+            initialvalue=self.transform_smoothing, minvalue=0.0
+        )  # 弹出对话框询问平滑参数
+        if smoothing is not None:  # 未点按取消或者关闭
+            self.transform_smoothing = smoothing  # 记录平滑参数
+            self.schedule_preview()  # 刷新实时预览
+
+    # 算法操作：设置CSRBF算法的支撑半径
+    def set_CSRBF_support(self):
+        support = simpledialog.askfloat(
+            'CSRBF Support', 'Support radius in pixels (0 for automatic):',
+            initialvalue=self.transform_support, minvalue=0.0
+        )  # 弹出对话框询问支撑半径
+        if support is not None:  # 未点按取消或者关闭
+            self.transform_support = support  # 记录支撑半径
+            self.schedule_preview()  # 刷新实时预览
+
+    # 算法操作：设置形变场近似的容差
+    def set_field_tolerance(self):
+        tolerance = simpledialog.askfloat(
+            'Field Tolerance', 'Checkpoint tolerance in pixels (0 for exact evaluation):',
+            initialvalue=self.transform_tolerance, minvalue=0.0
+        )  # 弹出对话框询问容差
+        if tolerance is not None:  # 未点按取消或者关闭
+            self.transform_tolerance = tolerance  # 记录容差
 
     '''此处添加更多算法操作
     def set_algorithm_to_more_algorithm(self):
@@ -100,16 +228,8 @@ class GUI:
                 )
             )
         )  # 示例映射坐标点
-        for i, (x, y) in self.original_landmarks.items():  # 遍历示例映射坐标点
-            self.original_canvas.create_oval(
-                x - 6, y - 6, x + 6, y + 6,  # 圆形的左上角坐标与右下角坐标
-                fill='#FF5555', tags=('point%d' % i)  # 颜色为红色，标记为point[*]
-            )  # 显示圆形映射坐标点
-            self.original_canvas.create_text(
-                x, y,  # 序号的坐标
-                text=str(i), justify=tk.CENTER,  # 居中放置
-                font=('Helvetica', '7'), tags=('text%d' % i)  # 标记为text[*]
-            )  # 显示对应映射坐标点的序号
+        self.original_viewport.landmarks = self.original_landmarks  # 视口与示例映射坐标点共用同一记录
+        self.original_viewport.draw()  # 显示示例映射坐标点
 
         self.open_reference_image(reference_image_path='./example/example_ape.tif')  # 打开示例参考图像
         self.reference_landmarks_number = 23  # 示例映射坐标点的数量
@@ -128,22 +248,14 @@ class GUI:
                 )
             )
         )  # 示例映射坐标点
-        for i, (x, y) in self.reference_landmarks.items():  # 遍历示例映射坐标点
-            self.reference_canvas.create_oval(
-                x - 6, y - 6, x + 6, y + 6,  # 圆形的左上角坐标与右下角坐标
-                fill='#1E90FF', tags=('point%d' % i)  # 颜色为蓝色，标记为point[*]
-            )  # 显示圆形映射坐标点
-            self.reference_canvas.create_text(
-                x, y,  # 序号的坐标
-                text=str(i), justify=tk.CENTER,  # 居中放置
-                font=('Helvetica', '7'), tags=('text%d' % i)  # 标记为text[*]
-            )  # 显示对应映射坐标点的序号
-
-        self.resultant_image = Image.open('./example/example_TPS.png').resize(
-            (self.WINDOW_WIDTH // 4, self.WINDOW_WIDTH // 4)
+        self.reference_viewport.landmarks = self.reference_landmarks  # 视口与示例映射坐标点共用同一记录
+        self.reference_viewport.draw()  # 显示示例映射坐标点
+
+        resultant_pyramid = ImagePyramid('./example/example_TPS.png')  # 示例结果图像的金字塔
+        self.resultant_image = resultant_pyramid.render(
+            (0, 0) + resultant_pyramid.size, (self.WINDOW_WIDTH // 4, self.WINDOW_WIDTH // 4)
         )  # 打开示例结果图像，面积调整至W//4*W//4，适应窗口大小
-        self.tk_resultant_image = ImageTk.PhotoImage(self.resultant_image)  # 将示例结果图像转换为可渲染格式
-        self.resultant_canvas.create_image(0, 0, image=self.tk_resultant_image, anchor=tk.NW) # 在画布上显示示例结果图像，以左上角为度量起点
+        self.resultant_viewport.show(ImagePyramid(self.resultant_image))  # 在画布上显示示例结果图像
         self.transform_execute_time.set('Execute time: 75.26 s')  # 显示示例变换所需的时间
 
     # 帮助操作：查看版本信息
@@ -159,6 +271,9 @@ class GUI:
         file_menu = tk.Menu(menu_bar, tearoff=0)  # 文件选项
         menu_bar.add_cascade(label='File', menu=file_menu)  # 命名文件选项为File
         file_menu.add_command(label='Save', command=self.save_resultant_image)  # 下拉选项：保存
+        file_menu.add_command(label='Export Full Resolution...', command=self.export_full_resolution)  # 下拉选项：导出全分辨率结果
+        file_menu.add_command(label='Save Landmarks', command=self.save_landmarks)  # 下拉选项：保存映射坐标点
+        file_menu.add_command(label='Load Landmarks', command=self.load_landmarks)  # 下拉选项：读取映射坐标点
         file_menu.add_separator()  # 分割线
         file_menu.add_command(label='Exit', command=self.quit_program)  # 下拉选项：退出
 
@@ -166,11 +281,25 @@ class GUI:
         menu_bar.add_cascade(label='Algorithm', menu=alg_menu)  #命名算法选项为Algorithm
         alg_menu.add_radiobutton(label='TPS', command=self.set_algorithm_to_TPS)  # 下拉单选选项：选择TPS算法
         alg_menu.add_radiobutton(label='LARM', command=self.set_algorithm_to_LARM)  # 下拉单选选项：选择LARM算法
+        alg_menu.add_radiobutton(label='CSRBF', command=self.set_algorithm_to_CSRBF)  # 下拉单选选项：选择CSRBF算法
+        for mode in MLSDeformer.MODES:  # 遍历MLS的变换类型
+            alg_menu.add_radiobutton(label='MLS %s' % mode.capitalize(), command=lambda mode=mode: self.set_algorithm_to_MLS(mode))  # 下拉单选选项：选择MLS算法
+        alg_menu.add_separator()  # 分割线
+        alg_menu.add_command(label='TPS Smoothing...', command=self.set_TPS_smoothing)  # 下拉选项：设置TPS平滑参数
+        alg_menu.add_command(label='CSRBF Support...', command=self.set_CSRBF_support)  # 下拉选项：设置CSRBF支撑半径
+        alg_menu.add_command(label='Field Tolerance...', command=self.set_field_tolerance)  # 下拉选项：设置形变场近似的容差
+        alg_menu.add_checkbutton(label='Float32 Field', variable=self.field_float32)  # 下拉复选选项：以float32保存形变场
+        alg_menu.add_checkbutton(label='Live Preview', variable=self.live_preview, command=self.schedule_preview)  # 下拉复选选项：实时预览
 
         '''此处添加更多算法选项
         alg_menu.add_radiobutton(label='more_algorithm', command=self.set_algorithm_to_more_algorithm)  # 下拉单选选项：选择更多算法
         '''
 
+        interp_menu = tk.Menu(menu_bar, tearoff=0)  # 插值选项
+        menu_bar.add_cascade(label='Interpolation', menu=interp_menu)  # 命名插值选项为Interpolation
+        for method in ('nearest', 'bilinear', 'bicubic', 'lanczos'):  # 遍历重采样器支持的插值方式
+            interp_menu.add_radiobutton(label=method.capitalize(), value=method, variable=self.transform_interpolation)  # 下拉单选选项：选择插值方式
+
         help_menu = tk.Menu(menu_bar, tearoff=0)  # 帮助选项
         menu_bar.add_cascade(label='Help', menu=help_menu)  # 命名帮助选项为Help
         help_menu.add_command(label='Usage', command=self.show_project_usage)  # 下拉选项：使用文档
@@ -195,11 +324,12 @@ class GUI:
                 return  # 未打开原始图像，操作结束
 
         self.delete_all_original_landmarks()  # 删除原有的映射坐标点，更换原始图像时起效
-        self.original_image = Image.open(original_image_path).resize(
-            (self.WINDOW_WIDTH // 4, self.WINDOW_WIDTH // 4)
-        )  # 记录原始图像，面积调整至W//4*W//4，适应窗口大小
-        self.tk_original_image = ImageTk.PhotoImage(self.original_image)  # 将原始图像转换为可渲染格式
-        self.original_canvas.create_image(0, 0, image=self.tk_original_image, anchor=tk.NW)  # 在画布上显示原始图像，以左上角为度量起点
+        self.original_image_path = original_image_path  # 记录原始图像的文件路径
+        original_pyramid = ImagePyramid(original_image_path)  # 只读取文件头，按显示所需的分辨率解码
+        self.original_image = original_pyramid.render(
+            (0, 0) + original_pyramid.size, (self.WINDOW_WIDTH // 4, self.WINDOW_WIDTH // 4)
+        )  # 记录原始图像，面积调整至W//4*W//4，适应窗口大小，大图像从缩小的层缩放
+        self.original_viewport.show(original_pyramid)  # 在画布上显示原始图像的可见区域
 
     # 双击标记原始图像的映射坐标点
     def set_original_landmarks(self, event):
@@ -209,38 +339,37 @@ class GUI:
         if self.original_image is None:  # 未打开原始图像
             self.open_original_image()  # 双击打开原始图像
         else:  # 已打开原始图像
-            self.original_landmarks_number += 1  # 映射坐标点的数量增加1
-            self.original_canvas.create_oval(
-                event.x - 6, event.y - 6, event.x + 6, event.y + 6,  # 圆形的左上角坐标与右下角坐标
-                fill='#FF5555', tags=('point%d' % self.original_landmarks_number)  # 颜色为红色，标记为point[*]
-            )  # 显示圆形映射坐标点
-            self.original_canvas.create_text(
-                event.x, event.y,  # 序号的坐标
-                text=str(self.original_landmarks_number), justify=tk.CENTER,  # 居中放置
-                font=('Helvetica', '7'), tags=('text%d' % self.original_landmarks_number)  # 标记为text[*]
-            )  # 显示对应映射坐标点的序号
-            self.original_landmarks[self.original_landmarks_number] = (event.x, event.y)  # 记录映射坐标点的位置
+            self.add_original_landmark(*self.original_viewport.to_image(event.x, event.y))  # 在双击位置标记映射坐标点，换算至工作图像坐标
+
+    # 在原始图像画布上增加一个映射坐标点
+    def add_original_landmark(self, x, y):
+        self.original_landmarks_number += 1  # 映射坐标点的数量增加1
+        self.original_landmarks[self.original_landmarks_number] = (x, y)  # 记录映射坐标点的位置
+        self.original_viewport.draw_landmark(self.original_landmarks_number)  # 在画布上显示映射坐标点与序号
+        self.schedule_preview()  # 刷新实时预览
 
     # 方向键移动原始图像画布上当前最后一个映射坐标点
     def move_last_original_landmark(self, event=None):
         if self.original_landmarks_number != 0:  # 画布上存在映射坐标点，不存在则结束操作
             (x, y) = self.original_landmarks[self.original_landmarks_number]  # 记录映射坐标点的原位置
+            step = 1 / self.original_viewport.zoom  # 画布上的一个像素对应的工作图像距离
             if event.keysym == 'Up':  # 上方向键
                 self.original_canvas.move('point%d' % self.original_landmarks_number, 0, -1)  # 圆形映射坐标点往上移动一个像素
                 self.original_canvas.move('text%d' % self.original_landmarks_number, 0, -1)  # 对应坐标往上移动一个像素
-                self.original_landmarks[self.original_landmarks_number] = (x, y - 1)  # 记录映射坐标点的新位置
+                self.original_landmarks[self.original_landmarks_number] = (x, y - step)  # 记录映射坐标点的新位置
             elif event.keysym == 'Down':  # 下方向键
                 self.original_canvas.move('point%d' % self.original_landmarks_number, 0, 1)  # 圆形映射坐标点往下移动一个像素
                 self.original_canvas.move('text%d' % self.original_landmarks_number, 0, 1)  # 对应坐标往下移动一个像素
-                self.original_landmarks[self.original_landmarks_number] = (x, y + 1)  # 记录映射坐标点的新位置
+                self.original_landmarks[self.original_landmarks_number] = (x, y + step)  # 记录映射坐标点的新位置
             elif event.keysym == 'Left':  # 左方向键
                 self.original_canvas.move('point%d' % self.original_landmarks_number, -1, 0)  # 圆形映射坐标点往左移动一个像素
                 self.original_canvas.move('text%d' % self.original_landmarks_number, -1, 0)  # 对应坐标往左移动一个像素
-                self.original_landmarks[self.original_landmarks_number] = (x - 1, y)  # 记录映射坐标点的新位置
+                self.original_landmarks[self.original_landmarks_number] = (x - step, y)  # 记录映射坐标点的新位置
             elif event.keysym == 'Right':  # 右方向键
                 self.original_canvas.move('point%d' % self.original_landmarks_number, 1, 0)  # 圆形映射坐标点往右移动一个像素
                 self.original_canvas.move('text%d' % self.original_landmarks_number, 1, 0)  # 对应坐标往右移动一个像素
-                self.original_landmarks[self.original_landmarks_number] = (x + 1, y)  # 记录映射坐标点的新位置
+                self.original_landmarks[self.original_landmarks_number] = (x + step, y)  # 记录映射坐标点的新位置
+            self.schedule_preview()  # 刷新实时预览
 
     # 删除原始图像画布上当前最后一个映射坐标点
     def cancel_last_original_landmark(self, event=None):
@@ -249,6 +378,7 @@ class GUI:
             self.original_canvas.delete('text%d' % self.original_landmarks_number)  # 删除对应映射坐标点的序号
             del self.original_landmarks[self.original_landmarks_number]  # 删除记录中最后一个映射坐标点
             self.original_landmarks_number -= 1  # 映射坐标点的数量减少1
+            self.schedule_preview()  # 刷新实时预览
 
     # 删除原始图像画布上所有映射坐标点
     def delete_all_original_landmarks(self, event=None):
@@ -257,6 +387,7 @@ class GUI:
             self.original_canvas.delete('text%d' % i)  # 删除对应映射坐标点的序号
         self.original_landmarks.clear()  # 清空映射坐标点记录
         self.original_landmarks_number = 0  # 将映射坐标点的数量设为0
+        self.schedule_preview()  # 刷新实时预览
 
     # 渲染原始图像部分
     def render_original_part(self):
@@ -274,6 +405,7 @@ class GUI:
             x=self.WINDOW_WIDTH // 16, y=self.WINDOW_HEIGHT // 2 - 5 * self.WINDOW_WIDTH // 32,
             height=self.WINDOW_WIDTH // 4, width=self.WINDOW_WIDTH // 4
         )  # 原始图像画布的位置
+        self.original_viewport = Viewport(self.original_canvas, self.WINDOW_WIDTH // 4, self.original_landmarks, '#FF5555')  # 原始图像画布的视口
 
         self.open_original_image_button = tk.Button(
             self.window, text='Open', font=('Helvetica', '15'), command=self.open_original_image
@@ -316,11 +448,12 @@ class GUI:
                 return  # 未打开参考图像，操作结束
 
         self.delete_all_reference_landmarks()  # 删除原有的映射坐标点，更换参考图像时起效
-        self.reference_image = Image.open(reference_image_path).resize(
-            (self.WINDOW_WIDTH // 4, self.WINDOW_WIDTH // 4)
-        )  # 记录参考图像，面积调整至W//4*W//4，适应窗口大小
-        self.tk_reference_image = ImageTk.PhotoImage(self.reference_image)  # 将参考图像转换为可渲染格式
-        self.reference_canvas.create_image(0, 0, image=self.tk_reference_image, anchor=tk.NW)  # 在画布上显示参考图像，以左上角为度量起点
+        self.reference_image_path = reference_image_path  # 记录参考图像的文件路径
+        reference_pyramid = ImagePyramid(reference_image_path)  # 只读取文件头，按显示所需的分辨率解码
+        self.reference_image = reference_pyramid.render(
+            (0, 0) + reference_pyramid.size, (self.WINDOW_WIDTH // 4, self.WINDOW_WIDTH // 4)
+        )  # 记录参考图像，面积调整至W//4*W//4，适应窗口大小，大图像从缩小的层缩放
+        self.reference_viewport.show(reference_pyramid)  # 在画布上显示参考图像的可见区域
 
     # 双击标记参考图像的映射坐标点
     def set_reference_landmarks(self, event):
@@ -330,38 +463,37 @@ class GUI:
         if self.reference_image is None:  # 未打开参考图像
             self.open_reference_image()  # 双击打开参考图像
         else:  # 已打开参考图像
-            self.reference_landmarks_number += 1  # 映射坐标点的数量增加1
-            self.reference_canvas.create_oval(
-                event.x - 6, event.y - 6, event.x + 6, event.y + 6,  # 圆形的左上角坐标与右下角坐标
-                fill='#1E90FF', tags=('point%d' % self.reference_landmarks_number)  # 颜色为蓝色，标记为point[*]
-            )  # 显示圆形映射坐标点
-            self.reference_canvas.create_text(
-                event.x, event.y,  # 序号的坐标
-                text=str(self.reference_landmarks_number), justify=tk.CENTER,  # 居中放置
-                font=('Helvetica', '7'), tags=('text%d' % self.reference_landmarks_number)  # 标记为text[*]
-            )  # 显示对应映射坐标点的序号
-            self.reference_landmarks[self.reference_landmarks_number] = (event.x, event.y)  # 记录映射坐标点的位置
+            self.add_reference_landmark(*self.reference_viewport.to_image(event.x, event.y))  # 在双击位置标记映射坐标点，换算至工作图像坐标
+
+    # 在参考图像画布上增加一个映射坐标点
+    def add_reference_landmark(self, x, y):
+        self.reference_landmarks_number += 1  # 映射坐标点的数量增加1
+        self.reference_landmarks[self.reference_landmarks_number] = (x, y)  # 记录映射坐标点的位置
+        self.reference_viewport.draw_landmark(self.reference_landmarks_number)  # 在画布上显示映射坐标点与序号
+        self.schedule_preview()  # 刷新实时预览
 
     # 方向键移动参考图像画布上当前最后一个映射坐标点
     def move_last_reference_landmark(self, event=None):
         if self.reference_landmarks_number != 0:  # 画布上存在映射坐标点，不存在则结束操作
             (x, y) = self.reference_landmarks[self.reference_landmarks_number]  # 记录映射坐标点的原位置
+            step = 1 / self.reference_viewport.zoom  # 画布上的一个像素对应的工作图像距离
             if event.keysym == 'Up':  # 上方向键
                 self.reference_canvas.move('point%d' % self.reference_landmarks_number, 0, -1)  # 圆形映射坐标点往上移动一个像素
                 self.reference_canvas.move('text%d' % self.reference_landmarks_number, 0, -1)  # 对应坐标往上移动一个像素
-                self.reference_landmarks[self.reference_landmarks_number] = (x, y - 1)  # 记录映射坐标点的新位置
+                self.reference_landmarks[self.reference_landmarks_number] = (x, y - step)  # 记录映射坐标点的新位置
             elif event.keysym == 'Down':  # 下方向键
                 self.reference_canvas.move('point%d' % self.reference_landmarks_number, 0, 1)  # 圆形映射坐标点往下移动一个像素
                 self.reference_canvas.move('text%d' % self.reference_landmarks_number, 0, 1)  # 对应坐标往下移动一个像素
-                self.reference_landmarks[self.reference_landmarks_number] = (x, y + 1)  # 记录映射坐标点的新位置
+                self.reference_landmarks[self.reference_landmarks_number] = (x, y + step)  # 记录映射坐标点的新位置
             elif event.keysym == 'Left':  # 左方向键
                 self.reference_canvas.move('point%d' % self.reference_landmarks_number, -1, 0)  # 圆形映射坐标点往左移动一个像素
                 self.reference_canvas.move('text%d' % self.reference_landmarks_number, -1, 0)  # 对应坐标往左移动一个像素
-                self.reference_landmarks[self.reference_landmarks_number] = (x - 1, y)  # 记录映射坐标点的新位置
+                self.reference_landmarks[self.reference_landmarks_number] = (x - step, y)  # 记录映射坐标点的新位置
             elif event.keysym == 'Right':  # 右方向键
                 self.reference_canvas.move('point%d' % self.reference_landmarks_number, 1, 0)  # 圆形映射坐标点往右移动一个像素
                 self.reference_canvas.move('text%d' % self.reference_landmarks_number, 1, 0)  # 对应坐标往右移动一个像素
-                self.reference_landmarks[self.reference_landmarks_number] = (x + 1, y)  # 记录映射坐标点的新位置
+                self.reference_landmarks[self.reference_landmarks_number] = (x + step, y)  # 记录映射坐标点的新位置
+            self.schedule_preview()  # 刷新实时预览
 
     # 删除参考图像画布上当前最后一个映射坐标点
     def cancel_last_reference_landmark(self, event=None):
@@ -370,6 +502,7 @@ class GUI:
             self.reference_canvas.delete('text%d' % self.reference_landmarks_number)  # 删除对应映射坐标点的序号
             del self.reference_landmarks[self.reference_landmarks_number]  # 删除记录中最后一个映射坐标点
             self.reference_landmarks_number -= 1  # 映射坐标点的数量减少1
+            self.schedule_preview()  # 刷新实时预览
 
     # 删除参考图像画布上所有映射坐标点
     def delete_all_reference_landmarks(self, event=None):
@@ -378,6 +511,7 @@ class GUI:
             self.reference_canvas.delete('text%d' % i)  # 删除对应映射坐标点的序号
         self.reference_landmarks.clear()  # 清空映射坐标点记录
         self.reference_landmarks_number = 0  # 将映射坐标点的数量设为0
+        self.schedule_preview()  # 刷新实时预览
 
     # 渲染参考图像部分
     def render_reference_part(self):
@@ -395,6 +529,7 @@ class GUI:
             x=3 * self.WINDOW_WIDTH // 8, y=self.WINDOW_HEIGHT // 2 - 5 * self.WINDOW_WIDTH // 32,
             height=self.WINDOW_WIDTH // 4, width=self.WINDOW_WIDTH // 4
         )  # 参考图像画布的位置
+        self.reference_viewport = Viewport(self.reference_canvas, self.WINDOW_WIDTH // 4, self.reference_landmarks, '#1E90FF')  # 参考图像画布的视口
 
         self.open_reference_button = tk.Button(
             self.window, text='Open', font=('Helvetica', '15'), command=self.open_reference_image
@@ -425,30 +560,162 @@ class GUI:
     # 结果图像部分 #
     ###############
 
-    # 使用图像形变算法对原始图像按照参考图像进行空间变换，点击时会出现未响应的情况，等待片刻即可
-    def transform(self):
+    # 建立参考图像坐标至原始图像坐标的映射关系，坐标形式为(行, 列)
+    def landmark_mapping(self):
+        return {
+            self.reference_landmarks[num][::-1]: self.original_landmarks[num][::-1]
+            for num in range(1, self.original_landmarks_number + 1)
+        }
+
+    # 将映射关系从显示坐标换算至源图像坐标，以像素中心对齐：源坐标 = (显示坐标 + 0.5) * 缩放比例 - 0.5
+    def source_mapping(self):
+        with Image.open(self.original_image_path) as original_source, Image.open(self.reference_image_path) as reference_source:
+            original_scale = np.array(original_source.size[::-1]) / self.original_image.size[::-1]  # 原始图像(行, 列)方向的缩放比例，只读取文件头
+            reference_scale = np.array(reference_source.size[::-1]) / self.reference_image.size[::-1]  # 参考图像(行, 列)方向的缩放比例
+        return {
+            tuple(((np.array(ref) + 0.5) * reference_scale - 0.5).tolist()): tuple(((np.array(ori) + 0.5) * original_scale - 0.5).tolist())
+            for ref, ori in self.landmark_mapping().items()
+        }
+
+    # 检查图像与映射坐标点是否满足变换条件，不满足时弹出错误框
+    def check_landmarks(self):
         if self.original_image is None or self.reference_image is None:  # 未打开原始图像或参考图像
             messagebox.showerror('Error', 'No original image or reference image!')  # 弹出错误框告示未打开原始图像或参考图像
-            return  # 操作结束
         elif self.original_landmarks_number != self.reference_landmarks_number:  # 原始图像与参考图像的映射坐标点数量不相等
             messagebox.showerror('Error', 'The number of landmarks is not equal!')  # 弹出错误框告示映射坐标点数量不相等
-            return  # 操作结束
         elif self.original_landmarks_number == 0 or self.reference_landmarks_number == 0:  # 原始图像或参考图像的映射坐标点数量为0
             messagebox.showerror('Error', 'No landmarks!')  # 弹出错误框告示无映射坐标点
+        else:  # 正常情况
+            return True
+        return False
+
+    # 将图像转换为可渲染的8位图像，16位与浮点图像按数据范围缩放，原图像仍用于变换与保存
+    @staticmethod
+    def displayable(image):
+        if image.mode in ('1', 'L', 'P', 'RGB', 'RGBA'):  # Tk可直接渲染的模式
+            return image
+        matrix = np.asarray(image, dtype=np.float64)  # 图像矩阵
+        peak = float(matrix.max()) if matrix.size else 0.0  # 最大像素值
+        scale = 65535.0 if image.mode.startswith('I;16') or (image.mode == 'I' and 255 < peak <= 65535) else max(peak, 1e-12)  # 缩放基准
+        return Image.fromarray(np.clip(matrix / scale * 255, 0, 255).astype(np.uint8))
+
+    # 使用图像形变算法对原始图像按照参考图像进行空间变换，变换在后台线程中执行，界面保持响应
+    def transform(self):
+        if not self.check_landmarks():  # 图像或映射坐标点不满足变换条件
             return  # 操作结束
         else:  # 正常情况
-            mapping = {
-                self.reference_landmarks[num][::-1]: self.original_landmarks[num][::-1]
-                for num in range(1, self.original_landmarks_number + 1)
-            }  # 建立坐标映射关系
-            # 实例化用于执行空间变换的图像变换器，参数为原始图像、参考图像、坐标映射关系与图像形变算法
-            self.deformer = Transform(self.original_image, self.reference_image, mapping, self.transform_algorithm)
+            mapping = self.landmark_mapping()  # 建立坐标映射关系
+            self.transform_cancel_event.clear()  # 重置取消事件
+            # 实例化用于执行空间变换的图像变换器，参数为原始图像、参考图像、坐标映射关系、图像形变算法与插值方式
+            self.deformer = Transform(
+                self.original_image, self.reference_image, mapping, self.transform_algorithm,
+                interpolation=self.transform_interpolation.get(),
+                smoothing=self.transform_smoothing, solver=self.tps_solver, cache=self.field_cache,  # TPS的平滑参数、可增量更新的求解器与形变场缓存
+                support=self.transform_support or None,  # CSRBF的支撑半径，为0时自动确定
+                mls_mode=self.mls_mode, mls=self.mls_deformer,  # MLS的变换类型与可复用的形变器
+                precision='float32' if self.field_float32.get() else 'float64',  # 形变场的精度
+                field_step=8 if self.transform_tolerance > 0 else 1, field_tolerance=self.transform_tolerance or None,  # 容差大于0时使用自适应粗网格近似
+                progress=lambda stage, fraction: self.transform_queue.put(('progress', stage, fraction)),  # 进度通过消息队列传递至主线程
+                cancel_event=self.transform_cancel_event
+            )
+            self.transform_thread = threading.Thread(target=self.execute_transform, args=(self.deformer, ), daemon=True)  # 后台线程
+            self.transform_thread.start()  # 开始执行空间变换
+            self.transform_button.config(text='Cancel', command=self.cancel_transform)  # 变换过程中按钮用于取消
+            self.window.after(50, self.poll_transform)  # 轮询后台线程的消息
+
+    # 后台线程：执行空间变换，将结果放入消息队列
+    def execute_transform(self, deformer):
+        try:
             start = time.time()  # 空间变换开始时的时间
-            self.resultant_image = Image.fromarray(self.deformer.spatial_transform())  # 进行空间变换，将得到的结果图像转换为PIL.Image.Image格式
+            resultant_matrix = deformer.spatial_transform()  # 进行空间变换
             end = time.time()  # 空间变换结束时的时间
-            self.tk_resultant_image = ImageTk.PhotoImage(self.resultant_image)  # 将结果图像转换为可渲染格式
-            self.resultant_canvas.create_image(0, 0, image=self.tk_resultant_image, anchor=tk.NW)  # 在画布上显示结果图像，以左上角为度量起点
-            self.transform_execute_time.set('Execute time: %.2f s' % (end - start))  # 显示执行图像空间变换所需的时间
+            self.transform_queue.put(('done', resultant_matrix, end - start))  # 传递结果图像矩阵与执行时间
+        except TransformCancelled:  # 空间变换被取消
+            self.transform_queue.put(('cancelled', ))
+        except Exception as error:  # 空间变换出错，如奇异矩阵
+            self.transform_queue.put(('error', error))
+
+    # 后台线程：以内存映射方式读取源图像，分块执行全分辨率空间变换，将结果路径放入消息队列
+    def execute_export(self, output_path, mapping, algorithm, options):
+        try:
+            start = time.time()  # 分块变换开始时的时间
+            original_matrix = Transform.open_image_matrix(self.original_image_path, os.path.join(self.field_cache.cache_dir, 'images'))  # 内存映射的原始图像矩阵
+            with Image.open(self.reference_image_path) as reference_image:  # 参考图像只用于确定结果图像的尺寸
+                deformer = Transform(
+                    original_matrix, reference_image, mapping, algorithm,
+                    progress=lambda stage, fraction: self.transform_queue.put(('progress', stage, fraction)),
+                    cancel_event=self.transform_cancel_event, **options
+                )  # 全分辨率图像变换器，源图像按需读取
+            deformer.tiled_transform(output_path)  # 分块变换并写入内存映射的结果文件
+            self.transform_queue.put(('exported', output_path, time.time() - start))  # 传递结果路径与执行时间
+        except TransformCancelled:  # 分块变换被取消
+            self.transform_queue.put(('cancelled', ))
+        except Exception as error:  # 分块变换出错，如源图像无法读取
+            self.transform_queue.put(('error', error))
+
+    # 主线程：处理后台线程的消息，结果在主线程中渲染至画布
+    def poll_transform(self):
+        while True:
+            try:
+                message = self.transform_queue.get_nowait()  # 取出一条消息
+            except queue.Empty:  # 暂无消息
+                break
+            if message[0] == 'progress':  # 进度消息
+                _, stage, fraction = message
+                self.transform_execute_time.set('%s: %d%%' % (stage.capitalize(), 100 * fraction))  # 显示当前阶段与进度
+            else:  # 变换结束
+                self.transform_button.config(text='Transform', command=self.transform)  # 恢复变换按钮
+                if message[0] == 'done':  # 变换完成
+                    _, resultant_matrix, execute_time = message
+                    self.resultant_image = Image.fromarray(resultant_matrix)  # 将得到的结果图像转换为PIL.Image.Image格式
+                    self.resultant_viewport.show(ImagePyramid(self.resultant_image), keep=True)  # 在画布上显示结果图像，保留当前视口
+                    self.transform_execute_time.set('Execute time: %.2f s' % execute_time)  # 显示执行图像空间变换所需的时间
+                elif message[0] == 'exported':  # 全分辨率结果导出完成
+                    _, output_path, execute_time = message
+                    self.transform_execute_time.set('Exported in %.2f s' % execute_time)  # 显示导出所需的时间
+                    messagebox.showinfo('Export', 'Full resolution result saved to %s' % output_path)  # 弹出信息框提示结果文件位置
+                elif message[0] == 'cancelled':  # 变换被取消
+                    self.transform_execute_time.set('Cancelled')  # 显示已取消
+                else:  # 变换出错
+                    self.transform_execute_time.set('Failed')  # 显示失败
+                    messagebox.showerror('Error', 'Transform failed: %s' % message[1])  # 弹出错误框告示错误原因
+                return  # 结束轮询
+        self.window.after(50, self.poll_transform)  # 继续轮询
+
+    # 取消正在执行的空间变换
+    def cancel_transform(self):
+        self.transform_cancel_event.set()  # 设置取消事件，后台线程在下一个检查点终止
+        self.transform_execute_time.set('Cancelling...')  # 显示正在取消
+
+    # 编辑映射坐标点后延迟刷新预览，连续编辑时只执行最后一次
+    def schedule_preview(self):
+        if self.preview_job is not None:  # 存在尚未执行的预览任务
+            self.window.after_cancel(self.preview_job)  # 取消该任务
+            self.preview_job = None
+        if self.live_preview.get():  # 已开启实时预览
+            self.preview_job = self.window.after(50, self.preview)  # 50毫秒内无新的编辑时执行预览
+
+    # 在1/8分辨率的粗网格上计算形变场并插值，快速显示低质量的预览结果
+    def preview(self):
+        self.preview_job = None  # 预览任务已开始执行
+        if (
+            self.original_image is None or self.reference_image is None or  # 未打开原始图像或参考图像
+            self.original_landmarks_number != self.reference_landmarks_number or self.original_landmarks_number == 0 or  # 映射坐标点未配对
+            (self.transform_thread is not None and self.transform_thread.is_alive())  # 正在执行完整的空间变换
+        ):
+            return  # 不满足预览条件，操作结束
+        preview_deformer = Transform(
+            self.original_image, self.reference_image, self.landmark_mapping(), self.transform_algorithm,
+            interpolation='bilinear', field_step=8, smoothing=self.transform_smoothing, solver=self.tps_solver,
+            support=self.transform_support or None, mls_mode=self.mls_mode, mls=self.mls_deformer, precision='float32'
+        )  # 预览使用粗网格形变场与双线性插值
+        try:
+            self.preview_image = Image.fromarray(preview_deformer.spatial_transform())  # 计算预览图像
+        except (np.linalg.LinAlgError, ValueError):  # 映射坐标点不足以确定形变函数，如CSRBF存在重合的映射坐标点
+            self.transform_execute_time.set('Preview unavailable')  # 显示无法预览
+            return
+        self.resultant_viewport.show(ImagePyramid(self.preview_image), keep=True)  # 在画布上显示预览图像，保留当前视口
+        self.transform_execute_time.set('Preview')  # 显示当前为预览结果
 
     # 渲染结果图像部分
     def render_resultant_part(self):
@@ -466,6 +733,7 @@ class GUI:
             x=11 * self.WINDOW_WIDTH // 16, y=self.WINDOW_HEIGHT // 2 - 5 * self.WINDOW_WIDTH // 32,
             height=self.WINDOW_WIDTH // 4, width=self.WINDOW_WIDTH // 4
         )  # 结果图像画布的位置
+        self.resultant_viewport = Viewport(self.resultant_canvas, self.WINDOW_WIDTH // 4)  # 结果图像画布的视口
 
         self.transform_button = tk.Button(
             self.window, text='Transform', font=('Helvetica', '15'), command=self.transform
@@ -508,6 +776,7 @@ class GUI:
         self.original_canvas.bind('<Key-Right>', self.move_last_original_landmark)  # 键盘右方向键：将原始图像画布上当前最后一个映射坐标点往右移动一个像素
         self.original_canvas.bind('<Key-BackSpace>', self.cancel_last_original_landmark)  # 键盘退格键：将原始图像画布上当前最后一个映射坐标点删除
         self.original_canvas.bind('<Key-Delete>', self.delete_all_original_landmarks)  # 键盘删除键：将原始图像画布上所有映射坐标点删除
+        self.original_canvas.bind('<Key-Home>', self.original_viewport.reset)  # 键盘Home键：恢复完整显示原始图像
 
         self.reference_canvas.bind('<Button-1>', lambda x: self.reference_canvas.focus_set())  # 鼠标左键单击参考图像画布：将参考图像画布设为焦点
         self.reference_canvas.bind('<Double-Button-1>', self.set_reference_landmarks)  # 鼠标左键双击参考图像画布：标记参考图像的映射坐标点，未打开参考图像时打开参考图像
@@ -519,6 +788,16 @@ class GUI:
         self.reference_canvas.bind('<Key-Right>', self.move_last_reference_landmark)  # 键盘右方向键：将参考图像画布上当前最后一个映射坐标点往右移动一个像素
         self.reference_canvas.bind('<Key-BackSpace>', self.cancel_last_reference_landmark)  # 键盘退格键：将参考图像画布上当前最后一个映射坐标点删除
         self.reference_canvas.bind('<Key-Delete>', self.delete_all_reference_landmarks)  # 键盘删除键：将参考图像画布上所有映射坐标点删除
+        self.reference_canvas.bind('<Key-Home>', self.reference_viewport.reset)  # 键盘Home键：恢复完整显示参考图像
+
+        for viewport in (self.original_viewport, self.reference_viewport, self.resultant_viewport):  # 遍历三个画布的视口
+            viewport.canvas.bind('<MouseWheel>', viewport.zoom_view)  # 鼠标滚轮：以光标为中心缩放画布（Windows与macOS）
+            viewport.canvas.bind('<Button-4>', viewport.zoom_view)  # 鼠标滚轮向上：以光标为中心放大画布（Linux）
+            viewport.canvas.bind('<Button-5>', viewport.zoom_view)  # 鼠标滚轮向下：以光标为中心缩小画布（Linux）
+            viewport.canvas.bind('<ButtonPress-3>', viewport.start_pan)  # 鼠标右键按下：开始平移画布
+            viewport.canvas.bind('<B3-Motion>', viewport.pan_view)  # 鼠标右键拖动：平移画布
+        self.resultant_canvas.bind('<Button-1>', lambda x: self.resultant_canvas.focus_set())  # 鼠标左键单击结果图像画布：将结果图像画布设为焦点
+        self.resultant_canvas.bind('<Key-Home>', self.resultant_viewport.reset)  # 键盘Home键：恢复完整显示结果图像
 
     # 运行交互程序
     def run(self):
@@ -527,21 +806,182 @@ class GUI:
         self.window.mainloop()  # 运行交互界面
 
 
+class ImagePyramid:
+    '''多分辨率图像金字塔，打开时只读取文件头，各层在首次显示时按缩小倍数解码'''
+
+    # 初始化，source为图像文件路径或PIL图像
+    def __init__(self, source):
+        self.source = source  # 图像来源
+        self.levels = dict()  # 已解码的层，键表示层号k，值表示边长约为原图1/2^k的图像
+        self.pages = list()  # TIFF中可直接读取的各分辨率页面，元素为(页号, 尺寸)
+        if isinstance(source, Image.Image):  # 内存中的图像，第0层即为该图像
+            self.size, self.format = source.size, None  # 原图尺寸(宽, 高)与文件格式
+            self.levels[0] = source
+        else:  # 图像文件，PIL打开时只解析文件头，像素数据在load时才解码
+            with Image.open(source) as image:
+                self.size, self.format = image.size, image.format
+                self.pages.append((0, image.size))  # 第0页为原图
+                if image.format == 'TIFF':  # 金字塔TIFF的缩小分辨率页面，NewSubfileType的最低位为1
+                    for i in range(1, getattr(image, 'n_frames', 1)):  # 遍历其余页面，seek只读取页面的文件头
+                        image.seek(i)
+                        if image.tag_v2.get(254, 0) & 1 and abs(image.size[0] * self.size[1] - image.size[1] * self.size[0]) <= self.size[0]:  # 宽高比一致
+                            self.pages.append((i, image.size))
+
+    # 按整数倍缩小图像，PIL的reduce不支持的模式（如I;16、P）使用盒式滤波缩放
+    @staticmethod
+    def reduce(image, factor):
+        try:
+            return image.reduce(factor)  # 每factor*factor个像素取平均
+        except ValueError:  # 不支持的模式
+            return image.resize((-(-image.width // factor), -(-image.height // factor)), Image.BOX)
+
+    # 解码第k层：JPEG在解码时按1/2、1/4、1/8缩小，金字塔TIFF读取最接近的缩小分辨率页面，其余格式解码后缩小
+    def decode(self, k):
+        target = (-(-self.size[0] // 2**k), -(-self.size[1] // 2**k))  # 第k层的最小尺寸(宽, 高)
+        if self.format is None:  # 内存中的图像
+            return self.reduce(self.levels[0], 2**k)
+        with Image.open(self.source) as image:
+            if image.format == 'JPEG':  # 只解码所需比例的DCT系数
+                image.draft(image.mode, target)
+            elif len(self.pages) > 1:  # 选择不小于目标尺寸的最小页面
+                image.seek(min((size[0], i) for i, size in self.pages if size[0] >= target[0])[1])
+            image.load()  # 解码像素数据
+            factor = max(image.width // target[0], 1)  # 解码后仍需缩小的倍数
+            return self.reduce(image, factor) if factor > 1 else image.copy()
+
+    # 获取第k层，解码结果缓存在金字塔中
+    def level(self, k):
+        if k not in self.levels:  # 尚未解码
+            self.levels[k] = self.decode(k)
+        return self.levels[k]
+
+    # 渲染原图中box=(左, 上, 右, 下)区域至size=(宽, 高)，从分辨率不低于输出的最小一层缩放
+    def render(self, box, size, resample=Image.BICUBIC):
+        scale = min((box[2] - box[0]) / size[0], (box[3] - box[1]) / size[1])  # 每个输出像素对应的原图像素数
+        image = self.level(int(np.log2(scale)) if scale >= 2 else 0)  # 缩小倍数不超过scale的层
+        ratio = (image.width / self.size[0], image.height / self.size[1])  # 该层相对原图的比例
+        return image.resize(size, resample, box=(box[0] * ratio[0], box[1] * ratio[1], box[2] * ratio[0], box[3] * ratio[1]))
+
+
+class Viewport:
+    '''画布视口，记录当前的平移与缩放，只渲染画布中可见的区域，映射坐标点以工作图像（S*S）坐标记录'''
+
+    # 常量
+    MAX_ZOOM = 64.0  # 最大放大倍数
+
+    # 初始化
+    def __init__(self, canvas, size, landmarks=None, colour=None):
+        self.canvas = canvas  # 所属画布
+        self.size = size  # 画布与工作图像的边长S
+        self.landmarks = landmarks if landmarks is not None else dict()  # 画布上的映射坐标点，键表示序号，值表示工作图像坐标
+        self.colour = colour  # 映射坐标点的颜色
+        self.pyramid = None  # 显示的图像金字塔
+        self.tk_image = None  # 渲染的可见区域，需保留引用以免被回收
+        self.pan_start = None  # 拖动平移的起点
+        self.reset()
+
+    # 恢复为完整显示工作图像的视口
+    def reset(self, event=None):
+        self.left, self.top, self.zoom = 0.0, 0.0, 1.0  # 可见区域左上角的工作图像坐标与放大倍数
+        if event is not None:  # 由按键触发时重新渲染
+            self.draw()
+
+    # 显示新的图像金字塔，keep为True时保留当前视口
+    def show(self, pyramid, keep=False):
+        self.pyramid = pyramid  # 记录图像金字塔
+        if not keep:  # 新图像从完整视口开始显示
+            self.reset()
+        self.draw()
+
+    # 画布坐标换算至工作图像坐标，以像素中心对齐
+    def to_image(self, x, y):
+        return self.left + (x + 0.5) / self.zoom - 0.5, self.top + (y + 0.5) / self.zoom - 0.5
+
+    # 工作图像坐标换算至画布坐标
+    def to_canvas(self, x, y):
+        return (x + 0.5 - self.left) * self.zoom - 0.5, (y + 0.5 - self.top) * self.zoom - 0.5
+
+    # 将可见区域限制在工作图像内
+    def clamp(self):
+        span = self.size / self.zoom  # 可见区域的边长（工作图像像素）
+        self.left = min(max(self.left, 0.0), self.size - span)
+        self.top = min(max(self.top, 0.0), self.size - span)
+
+    # 渲染可见区域与映射坐标点
+    def draw(self):
+        self.canvas.delete('all')  # 清空画布
+        if self.pyramid is not None:  # 已有图像
+            span = self.size / self.zoom  # 可见区域的边长
+            scale = (self.pyramid.size[0] / self.size, self.pyramid.size[1] / self.size)  # 原图相对工作图像的比例
+            box = (self.left * scale[0], self.top * scale[1], (self.left + span) * scale[0], (self.top + span) * scale[1])  # 可见区域在原图中的位置
+            resample = Image.BICUBIC if self.zoom < 4 else Image.NEAREST  # 放大较多时显示像素块，便于精确标记
+            self.tk_image = ImageTk.PhotoImage(GUI.displayable(self.pyramid.render(box, (self.size, self.size), resample)))  # 转换为可渲染格式
+            self.canvas.create_image(0, 0, image=self.tk_image, anchor=tk.NW)  # 以左上角为度量起点
+        for i in self.landmarks:  # 遍历映射坐标点
+            self.draw_landmark(i)
+
+    # 在画布上显示第i个映射坐标点
+    def draw_landmark(self, i):
+        x, y = self.to_canvas(*self.landmarks[i])  # 映射坐标点的画布坐标
+        self.canvas.create_oval(
+            x - 6, y - 6, x + 6, y + 6,  # 圆形的左上角坐标与右下角坐标
+            fill=self.colour, tags=('point%d' % i)  # 标记为point[*]
+        )  # 显示圆形映射坐标点
+        self.canvas.create_text(
+            x, y,  # 序号的坐标
+            text=str(i), justify=tk.CENTER,  # 居中放置
+            font=('Helvetica', '7'), tags=('text%d' % i)  # 标记为text[*]
+        )  # 显示对应映射坐标点的序号
+
+    # 滚轮以光标为中心缩放，Windows与macOS使用delta，Linux使用Button-4/5
+    def zoom_view(self, event):
+        factor = 1.25 if event.num == 4 or event.delta > 0 else 0.8  # 向上滚动放大，向下滚动缩小
+        x, y = self.to_image(event.x, event.y)  # 光标处的工作图像坐标，缩放后保持不动
+        self.zoom = min(max(self.zoom * factor, 1.0), self.MAX_ZOOM)  # 限制放大倍数
+        self.left, self.top = x + 0.5 - (event.x + 0.5) / self.zoom, y + 0.5 - (event.y + 0.5) / self.zoom
+        self.clamp()
+        self.draw()
+
+    # 右键按下时记录拖动平移的起点
+    def start_pan(self, event):
+        self.pan_start = (event.x, event.y)
+
+    # 右键拖动平移可见区域
+    def pan_view(self, event):
+        if self.pan_start is None:  # 未记录起点
+            return
+        self.left -= (event.x - self.pan_start[0]) / self.zoom  # 图像跟随光标移动
+        self.top -= (event.y - self.pan_start[1]) / self.zoom
+        self.pan_start = (event.x, event.y)  # 更新起点
+        self.clamp()
+        self.draw()
+
+
 class Transform:
     '''图像变换器，内含图像形变算法'''
 
-    # 初始化
-    def __init__(self, ori_image, ref_image, mapping, alg):
+    # 常量
+    TOLERANCE_SAFETY = 0.25  # 检查点上偏差的判定阈值与容差之比，检查点之间像素的偏差可能大于检查点上的偏差，需留有余量
 
-        self.ori_image_matrix = np.array(ori_image.convert('RGB'))  # 将原始图像转换成原始图像矩阵
+    # 初始化
+    def __init__(
+        self, ori_image, ref_image, mapping, alg, block_size=2**22, interpolation='bicubic', border='constant', workers=None,
+        progress=None, cancel_event=None, field_step=1, field_tolerance=None, smoothing=0.0, solver=None, cache=None,
+        support=None, mls_mode='affine', mls=None, precision='float64'
+    ):
+
+        if isinstance(ori_image, np.ndarray):  # 图像矩阵（可为内存映射的数组），直接使用而不读入内存
+            self.ori_image_matrix = ori_image
+        else:  # PIL.Image.Image格式的图像
+            self.ori_image_matrix = self.image_matrix(ori_image)  # 将原始图像转换成原始图像矩阵，保留灰度与16位精度
         self.ori_image_shape = self.ori_image_matrix.shape  # 原始图像的形状
-        self.ori_image_height, self.ori_image_width, _ = self.ori_image_shape  # 原始图像的高与宽
-        self.ori_image_grid = (np.array(list(product(range(self.ori_image_height), range(self.ori_image_width))))).reshape(-1, 2)  # 原始图像的坐标矩阵
+        self.ori_image_height, self.ori_image_width = self.ori_image_shape[:2]  # 原始图像的高与宽
 
-        self.ref_image_matrix = np.array(ref_image.convert('RGB'))  # 将参考图像转换成参考图像矩阵
-        self.ref_image_shape = self.ref_image_matrix.shape  # 参考图像的形状
-        self.ref_image_height, self.ref_image_width, _ = self.ref_image_shape  # 参考图像的高与宽
-        self.ref_image_grid = (np.array(list(product(range(self.ref_image_height), range(self.ref_image_width))))).reshape(-1, 2)  # 参考图像的坐标矩阵
+        if isinstance(ref_image, np.ndarray):  # 参考图像仅用于确定结果图像的尺寸，不需要读取像素
+            self.ref_image_height, self.ref_image_width = ref_image.shape[:2]  # 参考图像的高与宽
+        else:  # PIL.Image.Image格式的图像，读取尺寸时不会解码像素
+            self.ref_image_width, self.ref_image_height = ref_image.size  # 参考图像的宽与高
+        self.ref_image_shape = (self.ref_image_height, self.ref_image_width)  # 参考图像的形状
 
         self.mapping = mapping  # 坐标映射关系
         self.mapping_number = len(self.mapping)  # 映射坐标点数量
@@ -549,6 +989,182 @@ class Transform:
         self.mapping_result = np.array(list(map(list, self.mapping.values())))  # 结果图像的映射坐标点
 
         self.spatial_transform_algorithm = getattr(self, alg)  # 图像形变算法函数
+        self.block_size = block_size  # 分块计算时所有线程同时持有的像素与映射坐标点距离矩阵的元素数量上限，用于限制峰值内存
+        self.resampler = Resampler(interpolation, border)  # 反向变换使用的规则网格重采样器
+        self.workers = workers or os.cpu_count() or 1  # 并行计算行带的线程数量，默认为处理器核心数
+        self.progress = progress  # 进度回调函数，参数为阶段名称（solve、field、resample）与完成比例
+        self.cancel_event = cancel_event  # 取消事件，被设置时在下一个检查点终止空间变换
+        self.field_step = field_step  # 计算形变场的网格步长，大于1时在粗网格上计算后插值至每个像素
+        self.field_tolerance = field_tolerance  # 粗网格插值在检查点上的容差（像素），检查点偏差超标的网格单元被自适应细分，为None时不检查
+        self.smoothing = smoothing  # TPS的平滑参数λ，为0时精确插值映射坐标点
+        self.solver = solver  # 可复用的TPS求解器，映射坐标点少量变化时增量更新而无需重新分解
+        self.cache = cache  # 形变场的磁盘缓存，为None时不使用缓存
+        self.support = support  # CSRBF紧支撑径向基函数的支撑半径（像素），为None时根据映射坐标点的间距自动确定
+        self.mls_mode = mls_mode  # MLS的变换类型：affine、similarity或rigid
+        self.mls = mls  # 可复用的MLS形变器，源映射坐标点不变时复用预计算的权重与矩矩阵
+        self.field_dtype = np.dtype(precision)  # 形变场的数据类型，float32时内存与带宽减半，形变函数仍以float64计算
+        self.parameters = dict()  # 图像形变算法求解得到的参数
+
+        self.stage = None  # 当前所处的阶段
+        self.stage_start = 0  # 当前阶段开始的时刻
+        self.execute_time = dict()  # 各阶段（solve、field、resample）的执行时间，单位为秒
+
+    # 检查是否已取消空间变换
+    def check_cancel(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():  # 取消事件已被设置
+            raise TransformCancelled()  # 终止空间变换
+
+    # 报告当前阶段的进度，同时作为取消检查点并记录各阶段的执行时间
+    def report(self, stage, fraction):
+        self.check_cancel()  # 检查是否已取消
+        now = time.perf_counter()  # 当前时刻
+        if stage != self.stage:  # 进入新的阶段
+            self.stage, self.stage_start = stage, now
+        if fraction >= 1:  # 阶段完成
+            self.execute_time[stage] = now - self.stage_start  # 记录阶段的执行时间
+        if self.progress is not None:  # 设置了进度回调函数
+            self.progress(stage, fraction)  # 报告进度
+
+    # 读取映射坐标点文件，每行为原始图像坐标与参考图像坐标(x, y)，返回参考图像坐标至原始图像坐标的映射关系，坐标形式为(行, 列)
+    @staticmethod
+    def load_landmarks(landmarks_path):
+        with open(landmarks_path, newline='') as landmarks_file:
+            rows = list(csv.DictReader(landmarks_file))  # 按表头读取每一行
+        return {
+            (float(row['reference_y']), float(row['reference_x'])): (float(row['original_y']), float(row['original_x']))
+            for row in rows
+        }
+
+    # 将映射关系保存为映射坐标点文件，格式与load_landmarks相同
+    @staticmethod
+    def save_landmarks(landmarks_path, mapping):
+        with open(landmarks_path, 'w', newline='') as landmarks_file:
+            writer = csv.writer(landmarks_file)
+            writer.writerow(('original_x', 'original_y', 'reference_x', 'reference_y'))  # 表头
+            for (ref_y, ref_x), (ori_y, ori_x) in mapping.items():  # 遍历映射关系
+                writer.writerow((ori_x, ori_y, ref_x, ref_y))
+
+    # 计算坐标点集与映射坐标点之间的距离平方矩阵
+    def squared_distance(self, points):
+        return (
+            (points[:, 0:1] - self.mapping_region[:, 0])**2 +  # 垂直方向距离平方
+            (points[:, 1:2] - self.mapping_region[:, 1])**2  # 水平方向距离平方
+        )  # 距离平方矩阵，形状为坐标点数量*映射坐标点数量
+
+    # 分块计算坐标点集的映射结果，function将n*2坐标矩阵映射为n*2坐标矩阵
+    def evaluate_points(self, function, points, report=True):
+        block = max(1, min(
+            self.block_size // (self.mapping_number * self.workers),  # 最多workers个分块同时计算，保证它们的距离矩阵之和不超过元素数量上限
+            -(-len(points) // self.workers)  # 保证每个线程至少分到一个分块
+        ))  # 每个分块的坐标点数量
+        result = np.zeros((len(points), 2), dtype=self.field_dtype)  # 坐标点集的映射结果
+
+        def evaluate_block(start):
+            self.check_cancel()  # 已取消时跳过尚未开始的分块
+            result[start:start + block] = function(points[start:start + block])  # 计算分块内的映射结果
+
+        starts = range(0, len(points), block)  # 所有分块的起始位置
+        if report:  # 开始计算形变场
+            self.report('field', 0)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:  # NumPy的矩阵运算会释放GIL，多线程可以利用多核
+            for i, _ in enumerate(executor.map(evaluate_block, starts)):  # 并行计算所有分块，并传递其中的异常
+                if report:  # 由调用者统一报告进度时不重复报告
+                    self.report('field', (i + 1) / len(starts))  # 报告形变场计算进度
+        return result
+
+    # 计算参考图像坐标至原始图像坐标的映射关系，region为None时计算整幅参考图像，否则只计算区域(上, 左, 高, 宽)内的像素
+    def evaluate_field(self, function, region=None, report=True):
+        region = region or (0, 0, self.ref_image_height, self.ref_image_width)  # 计算区域
+        if self.field_step == 1:  # 在每个像素上精确计算
+            return self.evaluate_points(function, PixelGrid(region), report).reshape(region[2], region[3], 2)
+        else:  # 在粗网格上计算后插值
+            return self.approximate_field(function, region, report)
+
+    # 在粗网格上计算映射关系，双三次插值至每个像素，并在误差超过容差的网格单元内自适应细分
+    def approximate_field(self, function, region, report=True):
+
+        ##############################################################################################
+        # 网格单元边长为4 * field_step，每个单元内有4 * 4个子格，单元的双三次插值使用7 * 7个网格节点  #
+        # 容差不为None时，以半步长间隔在子格的中心、边中点与角点计算精确映射作为检查点，检查点上  #
+        # 最大偏差超过容差*TOLERANCE_SAFETY的单元被细分为4个边长减半的单元，直至网格步长小于2像素  #
+        # 时改为逐像素精确计算；容差是检查点的判定标准，不是所有像素偏差的严格上界                 #
+        ##############################################################################################
+        top, left, height, width = region  # 计算区域的位置与尺寸
+        size = 4 * self.field_step  # 网格单元的边长
+        rows = np.arange(top - top % size, top + height, size)  # 网格单元左上角的纵坐标，网格与整幅参考图像对齐，分块计算时结果一致
+        columns = np.arange(left - left % size, left + width, size)  # 网格单元左上角的横坐标
+        cells = np.stack(np.broadcast_arrays(rows[:, None], columns[None, :]), axis=-1).reshape(-1, 2)  # 所有网格单元的左上角坐标
+        mapping_matrix = np.zeros((height, width, 2), dtype=self.field_dtype)  # 区域内参考图像坐标至原始图像坐标的映射关系
+        finished = 0  # 已完成的像素数量
+        report = self.report if report else lambda stage, fraction: self.check_cancel()  # 不报告进度时仍然检查是否已取消
+        report('field', 0)  # 开始计算形变场
+
+        while len(cells):  # 逐层处理网格单元
+            step = size / 4  # 网格步长
+            offset = np.arange(size)  # 单元内像素相对左上角的偏移
+
+            if step < 2:  # 网格步长过小时逐像素精确计算
+                values = self.evaluate_points(function, self.cell_points(cells, offset, offset), report=False)  # 单元内像素的精确映射
+                finished += self.write_cells(mapping_matrix, region, cells, offset, values.reshape(len(cells), size, size, 2))  # 写入映射关系
+                report('field', finished / (height * width))  # 报告形变场计算进度
+                break
+
+            node = np.arange(-1, 6) * step  # 网格节点相对左上角的偏移，两侧各多一个节点以供双三次插值
+            nodes = self.evaluate_points(function, self.cell_points(cells, node, node), report=False).reshape(len(cells), 7, 7, 2)  # 网格节点上的映射
+            weight = Resampler.bicubic_kernel(offset[:, None] / step - (np.arange(7) - 1))  # 像素关于网格节点的双三次插值权重
+            values = self.interpolate_cells(weight, nodes)  # 单元内像素的插值映射
+
+            if self.field_tolerance is None:  # 不检查误差
+                bad = np.zeros(len(cells), dtype=bool)
+            else:  # 在子格的中心、边中点与角点检查插值误差
+                check = np.arange(8) * step / 2  # 检查点相对左上角的偏移，半步长间隔
+                exact = self.evaluate_points(function, self.cell_points(cells, check, check), report=False).reshape(len(cells), 8, 8, 2)  # 检查点的精确映射
+                check_weight = Resampler.bicubic_kernel(check[:, None] / step - (np.arange(7) - 1))  # 检查点的双三次插值权重
+                approximate = self.interpolate_cells(check_weight, nodes)  # 检查点的插值映射
+                error = np.max(np.linalg.norm(exact - approximate, axis=-1), axis=(1, 2))  # 每个单元在检查点上的最大偏差
+                bad = error > self.field_tolerance * self.TOLERANCE_SAFETY  # 需要细分的单元，检查点之间的偏差可能更大，留有余量
+
+            finished += self.write_cells(mapping_matrix, region, cells[~bad], offset, values[~bad])  # 写入满足容差的单元
+            report('field', finished / (height * width))  # 报告形变场计算进度
+
+            half = -(-size // 2)  # 细分后的单元边长
+            children = (cells[bad][:, None, :] + np.array([[0, 0], [0, half], [half, 0], [half, half]])).reshape(-1, 2)  # 细分得到的单元
+            cells = children[
+                (children[:, 0] < top + height) & (children[:, 0] + half > top) &
+                (children[:, 1] < left + width) & (children[:, 1] + half > left)
+            ]  # 去掉位于计算区域外的单元
+            size = half
+
+        return mapping_matrix
+
+    # 使用可分离的插值权重对所有网格单元批量插值：values = weight @ nodes @ weightT
+    @staticmethod
+    def interpolate_cells(weight, nodes):
+        return np.moveaxis(weight @ np.moveaxis(nodes, -1, 1) @ weight.T, 1, -1)  # 将坐标分量移至批量维度以使用矩阵乘法
+
+    # 网格单元内的坐标点集，row与column为相对左上角的偏移
+    @staticmethod
+    def cell_points(cells, row, column):
+        return np.stack(np.broadcast_arrays(
+            cells[:, None, None, 0] + row[None, :, None],  # 纵坐标
+            cells[:, None, None, 1] + column[None, None, :]  # 横坐标
+        ), axis=-1).reshape(-1, 2)
+
+    # 将网格单元内的映射写入区域的映射矩阵，超出区域的部分被截去，返回写入的像素数量
+    @staticmethod
+    def write_cells(mapping_matrix, region, cells, offset, values):
+        top, left, height, width = region  # 区域的位置与尺寸
+        row = cells[:, None, None, 0] - top + offset[None, :, None]  # 像素在区域内的纵坐标
+        column = cells[:, None, None, 1] - left + offset[None, None, :]  # 像素在区域内的横坐标
+        inside = (row >= 0) & (row < height) & (column >= 0) & (column < width)  # 位于区域内的像素
+        row, column = np.broadcast_arrays(row, column)  # 扩展为相同形状
+        mapping_matrix[row[inside], column[inside]] = values[inside]  # 写入映射关系
+        return np.count_nonzero(inside)
+
+    # 薄板样条径向基函数：sigma = r^2 * ln(r^2)，输入为距离平方r^2
+    @staticmethod
+    def radial_basis(squared_distance):
+        return squared_distance * np.log(squared_distance + 1e-16)  # 批量计算径向基函数
 
     # 薄板样条形变算法 - Thin Plate Spline Interpolation Method
     def TPS(self):
@@ -558,48 +1174,31 @@ class Transform:
         ######################################################################################################################
         # Transformation:                 # Solution:                                     # Description:                     #
         #                                 #   _param_     _   gamma   _       _homolog_   #                                  #
-        #  ori          Phi(ref)          #  |   W   |   | S   1  X  Y |^(-1)|  X'  Y' |  #  v(') = [x('); y(')]             #
+        #  ori          Phi(ref)          #  |   W   |   |S+λI 1  X  Y |^(-1)|  X'  Y' |  #  v(') = [x('); y(')]             #
         #  _|_   __________|____________  #  |   C   | = | 1T  0  0  0 |     |  0   0  |  #  r(v) = ||v||_2                  #
         #   v' = CT + AT @ v + WT @ s(v)  #  |_  A  _|   | XT  0  0  0 |     |  0   0  |  #  sigma(v) = r(v)^2 * ln(r(v)^2)  #
         #   |     |    |   |    |    |    #   (N+3)*2    |_YT  0  0  0_|     |_ 0   0 _|  #  si(v) = sigma(v - vi)           #
         #  2*1   2*1  2*2 2*1  2*N  N*1   #               (N+3)*(N+3)         (N+3)*2     #  Sij = sigma(vi - vj)            #
         #                                 #  Parameter =    Gamma^(-1)    @    Homolog    #                                  #
         ######################################################################################################################
-        sigma = np.vectorize(lambda v: np.sum(v**2) * np.log(np.sum(v**2) + 1e-16), signature='(m)->()')  # 写出sigma([x;y])函数：sigma(v) = r(v)^2 * ln(r(v)^2)
-        s = lambda v: sigma(self.mapping_region - v).reshape(-1, 1)  # 写出s([x; y])函数：s(v) = [sigma(v1 - v); ...; sigma(vn - v)]
-        Gamma = np.vstack((
-            np.hstack((
-                sigma(  # sigma([v1, v1, ..., v1; ...; vn, vn, ..., vn] - [v1, v2, ..., vn; ...; v1, v2, ..., vn])
-                    np.tile(self.mapping_region, (1, self.mapping_number)).reshape(self.mapping_number, self.mapping_number, 2) -
-                    np.tile(self.mapping_region, (self.mapping_number, 1)).reshape(self.mapping_number, self.mapping_number, 2)
-                ),  # gamma矩阵前n行前n列，子矩阵S，计算方法为Sij = sigma(vi - vj)
-                np.ones((self.mapping_number, 1)), # gamma矩阵前n行第n+1列，列向量1，形式为[1, 1, ..., 1]^T
-                self.mapping_region  # gamma矩阵前n行第n+2列第n+3列，列向量X, Y，形式为[x1, x2, ..., xn]^T, [y1, y2, ..., yn]^T
-            )),
-            np.hstack((
-                np.vstack(
-                    (
-                        np.ones(self.mapping_number),  # gamma矩阵第n+1行前n列，行向量1T，形式为[1, 1, ..., 1]
-                        self.mapping_region.T  # gamma矩阵第n+2行第n+3行前n列，列向量XT, YT，形式为[x1, x2, ..., xn], [y1, y2, ..., yn]
-                    )
-                ),
-                np.zeros((3, 3))  # gamma矩阵右下角3*3零矩阵，形式为[0, 0, 0; 0, 0, 0; 0, 0, 0]
-            ))
-        ))  # 计算Gamma矩阵：Gamma = [S, 1, X, Y; 1T, 0, 0, 0; XT, 0, 0, 0; YT, 0, 0, 0]
-        Homolog = np.vstack((
-            self.mapping_result,  # Homolog矩阵前n行第1列第2列，列向量X', Y'，形式为[x1', x2', ..., xn']^T, [y1', y2', ..., yn']^T
-            np.zeros((3, 2))  # Homolog矩阵下方3*2零矩阵，形式为[0, 0; 0, 0; 0, 0]
-        ))  # 计算Homolog矩阵：Homolog = [X', Y'; 0, 0; 0, 0; 0, 0]
-        Parameter = np.linalg.inv(Gamma) @ Homolog  # 计算Parameter矩阵：Parameter = Gamma^(-1) @ Homolog
-        W, C, A = np.vsplit(Parameter, [self.mapping_number, self.mapping_number + 1])  # 得到形变函数系数：[W; C; A] = Parameter
-        Phi = np.vectorize(lambda v: C.T + A.T @ v.reshape(-1, 1) + W.T @ s(v), signature='(m)->(n,k)')  # 得到薄板样条形变函数：[x'; y'] = Phi([x; y])
+        if self.solver is None:  # 未指定求解器，新建并分解Gamma矩阵
+            self.solver = TPSSolver(self.mapping_region, self.mapping_result, self.smoothing)
+        elif self.solver.smoothing != self.smoothing:  # 平滑参数改变，需要重新分解
+            self.solver.smoothing = self.smoothing
+            self.solver.reset(self.mapping_region, self.mapping_result)
+        else:  # 复用已有求解器，仅对发生变化的映射坐标点进行增量更新
+            self.solver.update(self.mapping_region, self.mapping_result)
+        W, C, A = self.solver.parameters()  # 得到形变函数系数：[W; C; A] = Parameter
+        self.parameters = {'W': W, 'C': C, 'A': A}  # 记录形变函数系数
+        self.report('solve', 1)  # 形变函数求解完成
+        Phi = lambda V: C + V @ A + self.radial_basis(self.squared_distance(V)) @ W  # 得到分块形式的薄板样条形变函数：[X', Y'] = Phi([X, Y])
 
         ###############
         # 应用形变函数 #
-        ###########################################################################
-        #  [x', y'] = (Phi([x; y]))^T = (CT + AT @ [x'; y'] + WT @ s([x; y]]))^T  #
-        ###########################################################################
-        self.mapping_matrix = Phi(self.ref_image_grid).reshape(self.ref_image_height, self.ref_image_width, 2)  # 建立参考图像坐标至原始图像坐标的映射关系
+        ##########################################################################
+        #  [X', Y'] = 1 @ C + [X, Y] @ A + S([X, Y]) @ W，每个分块一次矩阵乘法  #
+        ##########################################################################
+        return Phi  # 返回形变函数，由evaluate_field分块作用于参考图像坐标
 
     # 局部仿射形变算法 - Locally Affine Registration Method
     def LARM(self):
@@ -614,26 +1213,119 @@ class Transform:
         #  |_  y' _|   |_0   1   b_||_  1  _|  #  b = y' - y  #
         #     2*1           2*3        3*1     #              #
         #######################################################
-        translation = (self.mapping_result - self.mapping_region).reshape(-1, 1)  # 形变矩阵平移部分，形式为[a; b]
-        shear = np.tile(np.array([[1, 0], [0, 1]]), (self.mapping_number, 1))  # 形变矩阵错切部分，形式为[1, 0; 0, 1]
-        transformation = np.hstack((shear, translation)).reshape(-1, 2, 3)  # 合并得到仿射形变矩阵，形式为[1, 0, a; 0, 1, b]
+        translation = self.mapping_result - self.mapping_region  # 各形变矩阵的平移部分，形式为[a, b]，错切部分均为单位矩阵
+        self.parameters = {'translation': translation}  # 记录形变矩阵的平移部分
+        self.report('solve', 1)  # 形变矩阵计算完成
 
         ###############
         # 应用形变函数 #
-        ###################################################
-        #  [x', y'] = (T @ [x; y; 1])^T = [x + a, y + b]  #
-        ###################################################
+        ##################################################################################
+        #  加权平均形变矩阵作用于[x; y; 1]，单位错切部分的平均仍为单位矩阵，因此仅需平移  #
+        #  [x', y'] = [x, y] + sum(w_i * [a_i, b_i]) / sum(w_i)，w_i = ||v - v_i||^(-e)   #
+        ##################################################################################
         e = 2  # 距离指数
-        self.mapping_matrix = np.zeros([self.ref_image_height, self.ref_image_width, 2])  # 建立参考图像坐标至原始图像坐标的映射关系
-        for h in range(self.ref_image_height):  # 遍历参考图像垂直方向
-            for w in range(self.ref_image_width):  # 遍历参考图像水平方向
-                if (h, w) in self.mapping:  # 当前坐标点为映射坐标点
-                    self.mapping_matrix[h, w] = self.mapping[(h, w)]  # 直接使用坐标映射关系得到结果坐标
-                else:  # 当前坐标点为非映射坐标点
-                    weights = np.power(np.linalg.norm(self.mapping_region - np.array([h, w]), axis=1), -e)  # 计算所有局部仿射形变矩阵的权重
-                    self.mapping_matrix[h, w] = np.array([h, w, 1]) @ np.average(transformation, axis=0, weights=weights).T  # 将加权局部仿射形变矩阵作用于参考图像坐标
-
-    '''此处添加更多算法
+
+        def Phi(V):
+            distance = self.squared_distance(V)  # 行带内像素至映射坐标点的距离平方
+            coincide = distance == 0  # 与映射坐标点重合的位置
+            with np.errstate(divide='ignore'):  # 重合位置的权重为无穷大，随后被掩码屏蔽
+                weights = np.where(coincide, 0, distance**(-e / 2))  # 计算所有局部仿射形变矩阵的权重
+            result = V + (weights @ translation) / np.sum(weights, axis=1, keepdims=True)  # 将加权局部仿射形变矩阵作用于参考图像坐标
+            hit = np.any(coincide, axis=1)  # 当前坐标点为映射坐标点
+            result[hit] = self.mapping_result[np.argmax(coincide[hit], axis=1)]  # 直接使用坐标映射关系得到结果坐标
+            return result
+
+        return Phi  # 返回形变函数，由evaluate_field分块作用于参考图像坐标
+
+    # Wendland C2紧支撑径向基函数：phi(r) = (1 - r/rho)^4 * (4r/rho + 1)，r >= rho时为0
+    @staticmethod
+    def wendland(distance, support):
+        r = np.minimum(distance / support, 1)  # 归一化距离，支撑半径外截断为1
+        return (1 - r)**4 * (4 * r + 1)  # 批量计算径向基函数
+
+    # 紧支撑径向基函数的支撑半径，未指定时取映射坐标点至第8近邻距离的中位数，使每个基函数覆盖若干相邻映射坐标点
+    def support_radius(self, tree):
+        if self.support:  # 已指定支撑半径
+            return float(self.support)
+        k = min(self.mapping_number - 1, 8)  # 近邻数量
+        if k < 1:  # 只有一个映射坐标点，支撑半径覆盖整幅图像
+            return float(max(self.ref_image_shape))
+        distance, _ = tree.query(self.mapping_region, k + 1)  # 至自身与k个近邻的距离
+        return max(float(np.median(distance[:, k])), 1.0)
+
+    # 紧支撑径向基函数形变算法 - Compactly Supported Radial Basis Function Method
+    def CSRBF(self):
+
+        ###############
+        # 计算形变函数 #
+        ####################################################################################################
+        # Transformation:                                          # Solution:                           #
+        #                                                          #                                     #
+        #  v' = v + c + (v - m) @ D + sum(w_i * phi(||v - v_i||))  #  [c; D] = lstsq([1, V - m], V' - V) #
+        #                                                          #  W = S^(-1) @ (V' - V - P @ [c; D]) #
+        #  m为映射坐标点的均值，phi为Wendland C2函数               #  Sij = phi(||vi - vj||)，稀疏矩阵    #
+        ####################################################################################################
+        displacement = self.mapping_result - self.mapping_region  # 映射坐标点的位移
+        mean = np.mean(self.mapping_region, axis=0)  # 映射坐标点的均值，中心化后少于3个映射坐标点时仿射部分退化为平移
+        P = np.hstack([np.ones((self.mapping_number, 1)), self.mapping_region - mean])  # 仿射部分的设计矩阵
+        affine = np.linalg.lstsq(P, displacement, rcond=None)[0]  # 最小范数的仿射位移系数[c; D]
+        C = affine[:1] - mean @ affine[1:]  # 常数项
+        A = np.eye(2) + affine[1:]  # 线性项
+        tree = cKDTree(self.mapping_region)  # 映射坐标点的KD树
+        support = self.support_radius(tree)  # 支撑半径
+        pairs = tree.sparse_distance_matrix(tree, support, output_type='ndarray')  # 支撑半径内的映射坐标点对
+        pairs = pairs[pairs['i'] != pairs['j']]  # 对角元素phi(0) = 1单独加入
+        S = coo_matrix(
+            (self.wendland(pairs['v'], support), (pairs['i'], pairs['j'])), shape=(self.mapping_number, self.mapping_number)
+        ) + identity(self.mapping_number)  # 稀疏的对称正定矩阵
+        try:
+            W = splu(S.tocsc()).solve(displacement - P @ affine)  # 径向基函数拟合仿射部分的残差
+        except RuntimeError:  # 存在重合的映射坐标点时矩阵奇异
+            raise np.linalg.LinAlgError('Singular CSRBF system, landmarks coincide')
+        self.parameters = {'W': W, 'C': C, 'A': A, 'support': support}  # 记录形变函数系数
+        self.report('solve', 1)  # 形变函数求解完成
+
+        ###############
+        # 应用形变函数 #
+        ########################################################################
+        #  KD树只找出支撑半径内的映射坐标点，每个像素只与常数个映射坐标点相关  #
+        ########################################################################
+        def Phi(V):
+            pairs = cKDTree(V).sparse_distance_matrix(tree, support, output_type='ndarray')  # 分块内像素与支撑半径内映射坐标点的点对
+            K = coo_matrix(
+                (self.wendland(pairs['v'], support), (pairs['i'], pairs['j'])), shape=(len(V), self.mapping_number)
+            )  # 稀疏的径向基函数矩阵
+            return C + V @ A + K @ W
+
+        return Phi  # 返回形变函数，由evaluate_field分块作用于参考图像坐标
+
+    # 移动最小二乘形变算法 - Moving Least Squares Method
+    def MLS(self):
+
+        ###############
+        # 计算形变函数 #
+        ##############################################################################################
+        # Transformation:                        # Solution:                                       #
+        #                                        #                                                 #
+        #  v' = f_v(v) = (v - p*) @ M_v + q*     #  M_v = argmin sum(w_j * |(p_j - p*) @ M - q^_j|^2)  #
+        #  w_j = 1 / |p_j - v|^(2 * alpha)       #  M_v为仿射、相似或刚性矩阵                       #
+        #  p* = sum(w_j * p_j) / sum(w_j)        #  对固定的源映射坐标点p，f_v(v)是q的线性函数，    #
+        #  q* = sum(w_j * q_j) / sum(w_j)        #  系数只依赖于v与p，可预计算（刚性另需归一化）    #
+        ##############################################################################################
+        if self.mls is None:  # 未指定形变器，新建形变器
+            self.mls = MLSDeformer(self.mls_mode)
+        self.mls.update(self.mapping_region, self.mls_mode)  # 源映射坐标点或变换类型改变时清空预计算表
+        self.parameters = {'mode': self.mls.mode, 'alpha': self.mls.alpha}  # 记录变换类型与距离指数
+        self.report('solve', 1)  # 无需求解，形变函数直接由预计算表与目标映射坐标点得到
+
+        ###############
+        # 应用形变函数 #
+        ######################################################################
+        #  [X', Y'] = K @ Q + offset，每个分块一次矩阵乘法，预计算表按分块缓存  #
+        ######################################################################
+        return lambda V: self.mls.deform(V, self.mapping_result)  # 返回形变函数，由evaluate_field分块作用于参考图像坐标
+
+    '''此处添加更多算法，求解形变参数后返回形变函数Phi，Phi将n*2的参考图像坐标矩阵映射为n*2的原始图像坐标矩阵
     # 更多算法
     def more_algorithm(self):
         pass
@@ -641,20 +1333,648 @@ class Transform:
 
     # 反向图像空间变换算法
     def backward_warp(self):
-
-        # 三次样条插值得到对应值
-        R_matrix = griddata(self.ori_image_grid, self.ori_image_matrix[:, :, 0].reshape(-1), self.mapping_matrix, method='cubic').astype(np.uint8)  # R通道
-        G_matrix = griddata(self.ori_image_grid, self.ori_image_matrix[:, :, 1].reshape(-1), self.mapping_matrix, method='cubic').astype(np.uint8)  # G通道
-        B_matrix = griddata(self.ori_image_grid, self.ori_image_matrix[:, :, 2].reshape(-1), self.mapping_matrix, method='cubic').astype(np.uint8)  # B通道
-
-        # 合并为彩色图像矩阵
-        return np.hstack((R_matrix.reshape(-1, 1), G_matrix.reshape(-1, 1), B_matrix.reshape(-1, 1))).reshape(self.ref_image_height, self.ref_image_width, 3)
+        band_height = max(1, self.block_size // (self.ref_image_width * 16))  # 按行带重采样，以便报告进度与响应取消
+        resultant_matrix = np.zeros(self.ref_image_shape + self.ori_image_shape[2:], dtype=self.ori_image_matrix.dtype)  # 结果图像矩阵
+        self.report('resample', 0)  # 开始重采样
+        for top in range(0, self.ref_image_height, band_height):  # 遍历参考图像的行带
+            bottom = min(top + band_height, self.ref_image_height)  # 行带的结束行
+            resultant_matrix[top:bottom] = self.resampler.resample(self.ori_image_matrix, self.mapping_matrix[top:bottom])  # 在原始图像的规则网格上一次性对所有通道插值
+            self.report('resample', bottom / self.ref_image_height)  # 报告重采样进度
+        return resultant_matrix
+
+    # 计算参考图像坐标至原始图像坐标的映射关系（H*W*2），结果保存在mapping_matrix中，不构造位移场
+    def mapping_field(self):
+        self.report('solve', 0)  # 开始求解形变函数
+        key = self.cache_key() if self.cache is not None else None  # 形变场在缓存中的键
+        cached = self.cache.load(key) if key is not None else None  # 从缓存中读取形变场
+        if cached is not None:  # 缓存命中，跳过求解与形变场计算
+            self.mapping_matrix, self.parameters = cached
+            self.report('solve', 1)
+        else:  # 缓存未命中
+            self.mapping_matrix = self.evaluate_field(self.spatial_transform_algorithm())  # 求解形变函数并建立参考图像坐标至原始图像坐标的映射关系
+            if key is not None:  # 将形变场写入缓存
+                self.cache.store(key, self.mapping_matrix, self.parameters)
+        return self.mapping_matrix
+
+    # 计算形变场而不重采样图像，可与其他形变场复合后只重采样一次；只需重采样时使用mapping_field，避免分配位移场
+    def deformation_field(self):
+        return DeformationField(self.mapping_field())
 
     # 执行图像空间变换
     def spatial_transform(self):
-        self.spatial_transform_algorithm()  # 使用图像形变算法对图像执行形变
+        self.mapping_field()  # 计算映射关系
         return self.backward_warp()  # 使用反向变换算法对图像执行变换，返回得到的结果图像
 
+    # 分块执行图像空间变换，逐块计算形变场并重采样，结果写入内存映射的.npy文件，峰值内存只与分块大小有关
+    def tiled_transform(self, output_path, tile_size=1024):
+        self.report('solve', 0)  # 开始求解形变函数
+        Phi = self.spatial_transform_algorithm()  # 只求解形变参数，形变场按分块计算，不经过缓存
+        resultant_matrix = np.lib.format.open_memmap(
+            output_path, mode='w+', dtype=self.ori_image_matrix.dtype, shape=self.ref_image_shape + self.ori_image_shape[2:]
+        )  # 内存映射的结果图像矩阵
+        tiles = [
+            (top, left, min(tile_size, self.ref_image_height - top), min(tile_size, self.ref_image_width - left))
+            for top in range(0, self.ref_image_height, tile_size) for left in range(0, self.ref_image_width, tile_size)
+        ]  # 所有分块，形式为(上, 左, 高, 宽)
+        self.report('tile', 0)  # 开始分块变换
+        for i, (top, left, height, width) in enumerate(tiles, 1):  # 遍历分块
+            field = self.evaluate_field(Phi, (top, left, height, width), report=False)  # 分块内的形变场
+            resultant_matrix[top:top + height, left:left + width] = self.resample_window(field)  # 在源窗口内重采样
+            self.report('tile', i / len(tiles))  # 报告分块变换进度
+        resultant_matrix.flush()  # 将结果写入磁盘
+        return resultant_matrix
+
+    # 只读取形变场所需的原始图像窗口（含插值核的边缘）进行重采样，原始图像可为内存映射的数组
+    def resample_window(self, field):
+        (row_index, row_weight), (column_index, column_weight) = self.resampler.split(field, self.ori_image_shape)  # 拆分坐标
+        used_row, used_column = row_index[row_weight != 0], column_index[column_weight != 0]  # 权重非零的抽头，越界抽头不扩大窗口
+        if len(used_row) and len(used_column):  # 源窗口的范围
+            top, bottom, left, right = used_row.min(), used_row.max() + 1, used_column.min(), used_column.max() + 1
+        else:  # 分块完全映射至原始图像外部，只需要一个像素的窗口
+            top, bottom, left, right = 0, 1, 0, 1
+        window = np.asarray(self.ori_image_matrix[top:bottom, left:right])  # 从原始图像中读取窗口
+        splits = (
+            (np.clip(row_index - top, 0, bottom - top - 1), row_weight),  # 窗口内的垂直方向索引，权重为零的抽头截断至窗口内
+            (np.clip(column_index - left, 0, right - left - 1), column_weight)  # 窗口内的水平方向索引
+        )
+        return self.resampler.sample(window, splits).reshape(field.shape[:2] + self.ori_image_shape[2:])
+
+    # 将PIL.Image.Image格式的图像转换为图像矩阵：RGB与灰度保持原样，16位灰度为uint16，浮点为float32，其他模式转换为RGB
+    @staticmethod
+    def image_matrix(image):
+        if image.mode in ('RGB', 'L', 'F'):  # 8位RGB、8位灰度与32位浮点
+            return np.array(image)
+        elif image.mode.startswith('I;16'):  # 16位灰度，统一为本机字节序
+            return np.array(image).astype(np.uint16)
+        elif image.mode == 'I':  # 32位整数，16位PNG通常以该模式打开
+            matrix = np.array(image)  # int32图像矩阵
+            return matrix.astype(np.uint16) if matrix.size and 0 <= matrix.min() and matrix.max() <= 65535 else matrix
+        else:  # 调色板、RGBA、CMYK等模式
+            return np.array(image.convert('RGB'))
+
+    # 保存结果图像矩阵，PIL或目标格式无法表示的图像（如16位RGB、以PNG保存的浮点图像）保存为同名.npy文件，返回实际保存的路径
+    @staticmethod
+    def save_image(resultant_matrix, image_path):
+        try:
+            Image.fromarray(resultant_matrix).save(image_path)  # 转换为PIL.Image.Image格式后按后缀名保存
+        except (TypeError, OSError):  # PIL不支持该数据类型与通道数的组合，或目标格式无法写入该模式（如mode F写入PNG）
+            image_path = os.path.splitext(image_path)[0] + '.npy'
+            np.save(image_path, resultant_matrix)
+        return image_path
+
+    # 以内存映射方式打开图像矩阵，.npy文件直接映射，其他格式解码一次后保存在解码目录（默认为系统临时目录），不写入源图像所在目录
+    @staticmethod
+    def open_image_matrix(image_path, decode_dir=None):
+        if not image_path.lower().endswith('.npy'):  # 其他格式的图像
+            decode_dir = decode_dir or tempfile.gettempdir()  # 解码目录
+            os.makedirs(decode_dir, exist_ok=True)
+            status = os.stat(image_path)  # 源图像的文件信息，源图像修改后重新解码
+            key = FieldCache.key(os.path.abspath(image_path), status.st_size, status.st_mtime_ns)  # 解码结果的键
+            matrix_path = os.path.join(decode_dir, 'decoded_%s.npy' % key)  # 解码后的图像矩阵路径
+            if not os.path.exists(matrix_path):  # 尚未解码
+                temporary_path = matrix_path + '.tmp'  # 临时文件，避免读取到写入一半的图像矩阵
+                Transform.decode_image(image_path, temporary_path)
+                os.replace(temporary_path, matrix_path)  # 原子地替换为正式文件
+            image_path = matrix_path
+        return np.load(image_path, mmap_mode='r')  # 内存映射，按需读取
+
+    # 将覆盖整幅图像的未压缩解码单元（如未压缩TIFF的连续条带）按行切分，每个条带约4MB
+    @staticmethod
+    def raw_strips(image, tile):
+        if tile.codec_name != 'raw' or tuple(tile.extents) != (0, 0) + image.size:  # 压缩或只覆盖部分图像
+            return [tile]
+        args = tuple(tile.args) if isinstance(tile.args, tuple) else (tile.args, )  # 原始格式、行跨度与行方向，后两项可省略
+        rawmode, stride, orientation = args + (0, 1)[len(args) - 1:]
+        if orientation != 1:  # 自下而上存储
+            return [tile]
+        try:
+            row_bytes = stride or len(Image.new(image.mode, (image.width, 1)).tobytes('raw', rawmode))  # 每行的字节数
+        except ValueError:  # PIL不支持该原始格式的编码，无法确定每行的字节数
+            return [tile]
+        rows = max(1, 2**22 // row_bytes)  # 每个条带的行数
+        return [
+            tile._replace(extents=(0, top, image.width, min(top + rows, image.height)), offset=tile.offset + top * row_bytes)
+            for top in range(0, image.height, rows)
+        ]
+
+    # 将图像解码为.npy文件：TIFF的条带或分块按行逐条解码并写入内存映射的文件，峰值内存约为一行条带（分块）；
+    # PIL只能整体解码的图像（PNG、JPEG、使用libtiff解码的压缩TIFF等）以及32位整数图像（位深由整幅像素范围决定）整幅解码一次，峰值内存为整幅图像
+    @staticmethod
+    def decode_image(image_path, matrix_path):
+        with Image.open(image_path) as image:
+            (width, height), tiles = image.size, list(image.tile)  # 图像尺寸与解码单元
+            if len(tiles) == 1:  # 覆盖整幅图像的解码单元，未压缩时按行切分
+                tiles = Transform.raw_strips(image, tiles[0])
+            if len(tiles) <= 1 or image.mode == 'I':  # 只能整幅解码
+                with open(matrix_path, 'wb') as matrix_file:
+                    np.save(matrix_file, Transform.image_matrix(image))
+                return
+        bands = dict()  # 按行分组的解码单元
+        for tile in tiles:
+            bands.setdefault((tile.extents[1], tile.extents[3]), []).append(tile)
+        matrix = None  # 内存映射的图像矩阵，由第一行条带确定数据类型与通道数
+        for (top, bottom), band in sorted(bands.items()):  # 逐行解码
+            with Image.open(image_path) as strip:
+                strip._size = (width, bottom - top)  # 只包含该行条带的图像
+                strip.tile = [tile._replace(extents=(tile.extents[0], 0, tile.extents[2], bottom - top)) for tile in band]  # 只解码该行条带
+                strip_matrix = Transform.image_matrix(strip)  # 条带的图像矩阵
+            if matrix is None:  # 第一行条带
+                matrix = np.lib.format.open_memmap(
+                    matrix_path, mode='w+', dtype=strip_matrix.dtype, shape=(height, width) + strip_matrix.shape[2:]
+                )
+            matrix[top:bottom] = strip_matrix  # 写入内存映射的文件
+        matrix.flush()
+
+    # 形变场缓存的键，由算法、映射坐标点、图像尺寸与形变场计算参数决定，与插值方式无关
+    def cache_key(self):
+        return FieldCache.key(
+            self.spatial_transform_algorithm.__name__, self.mapping_region, self.mapping_result, self.ref_image_shape,
+            {'TPS': self.smoothing, 'CSRBF': self.support, 'MLS': self.mls_mode}.get(self.spatial_transform_algorithm.__name__),  # 算法相关的参数
+            self.field_step, self.field_tolerance, self.TOLERANCE_SAFETY, self.field_dtype.name
+        )
+
+
+class PixelGrid:
+    '''区域内像素坐标的惰性序列，按行优先排列，切片时才生成该段的n*2坐标矩阵，不必保存整个区域的坐标'''
+
+    # 初始化，区域形式为(上, 左, 高, 宽)
+    def __init__(self, region):
+        self.top, self.left, self.height, self.width = region  # 区域的位置与尺寸
+
+    # 像素数量
+    def __len__(self):
+        return self.height * self.width
+
+    # 由一维切片生成坐标矩阵
+    def __getitem__(self, index):
+        start, stop, step = index.indices(len(self))  # 切片范围
+        row, column = np.divmod(np.arange(start, stop, step), self.width)  # 一维索引转换为区域内的行与列
+        return np.stack([row + self.top, column + self.left], axis=1).astype(np.float64)
+
+
+class TransformCancelled(Exception):
+    '''图像空间变换被取消'''
+
+
+class FieldCache:
+    '''形变场的磁盘缓存，形变场保存为可内存映射的.npy文件，求解参数保存为.npz文件，按总大小进行LRU淘汰'''
+
+    # 初始化
+    def __init__(self, cache_dir, max_bytes=512 * 2**20):
+        self.cache_dir = cache_dir  # 缓存目录
+        self.max_bytes = max_bytes  # 缓存的总大小上限，单位为字节
+
+    # 由任意参数计算缓存的键，数组按数据类型、形状与内容计算哈希值
+    @staticmethod
+    def key(*parts):
+        digest = hashlib.sha1()  # 哈希函数
+        for part in parts:  # 遍历参数
+            if isinstance(part, np.ndarray):  # 数组
+                digest.update(str((part.dtype, part.shape)).encode())
+                digest.update(np.ascontiguousarray(part).tobytes())
+            else:  # 其他参数
+                digest.update(repr(part).encode())
+            digest.update(b'|')  # 分隔符
+        return digest.hexdigest()
+
+    # 缓存条目的文件路径
+    def paths(self, key):
+        return os.path.join(self.cache_dir, key + '.npy'), os.path.join(self.cache_dir, key + '.npz')  # 形变场与求解参数
+
+    # 读取缓存条目，返回内存映射的形变场与求解参数，未命中时返回None
+    def load(self, key):
+        field_path, parameter_path = self.paths(key)  # 缓存条目的文件路径
+        try:
+            mapping_matrix = np.load(field_path, mmap_mode='r')  # 内存映射读取形变场
+            with np.load(parameter_path) as parameter_file:
+                parameters = dict(parameter_file)  # 读取求解参数
+        except (OSError, ValueError):  # 条目不存在或已损坏
+            return None
+        for path in (field_path, parameter_path):  # 更新访问时间，用于LRU淘汰
+            os.utime(path)
+        return mapping_matrix, parameters
+
+    # 写入缓存条目，然后淘汰最久未使用的条目直至总大小不超过上限
+    def store(self, key, mapping_matrix, parameters):
+        os.makedirs(self.cache_dir, exist_ok=True)  # 新建缓存目录
+        field_path, parameter_path = self.paths(key)  # 缓存条目的文件路径
+        np.savez(parameter_path, **parameters)  # 先写入求解参数，形变场文件存在即表示条目完整
+        temporary_path = field_path + '.tmp'  # 临时文件，避免读取到写入一半的形变场
+        with open(temporary_path, 'wb') as field_file:
+            np.save(field_file, np.asarray(mapping_matrix))  # 写入形变场
+        os.replace(temporary_path, field_path)  # 原子地替换为正式文件
+        self.evict()
+
+    # 按最近访问时间从旧到新淘汰缓存条目
+    def evict(self):
+        entries = dict()  # 每个条目的总大小与最近访问时间
+        for name in os.listdir(self.cache_dir):  # 遍历缓存目录
+            key, suffix = os.path.splitext(name)  # 条目的键与文件类型
+            if suffix not in ('.npy', '.npz'):  # 跳过其他文件
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, name))  # 文件信息
+            size, last_used = entries.get(key, (0, 0))
+            entries[key] = (size + stat.st_size, max(last_used, stat.st_mtime))
+        total = sum(size for size, _ in entries.values())  # 缓存的总大小
+        for key, (size, _) in sorted(entries.items(), key=lambda entry: entry[1][1]):  # 从最久未使用的条目开始
+            if total <= self.max_bytes:  # 总大小不超过上限
+                break
+            for path in self.paths(key):  # 删除条目的文件
+                if os.path.exists(path):
+                    os.remove(path)
+            total -= size
+
+
+class TPSSolver:
+    '''薄板样条求解器，分解一次Gamma矩阵，映射坐标点增加、删除或移动时进行增量更新'''
+
+    # 求解器中Gamma矩阵的仿射部分在前、映射坐标点在后：M = [0, PT; P, S + λI]，P = [1, X, Y]
+    # 维护M的逆矩阵B，增加映射坐标点为加边更新，删除为降阶更新，移动为秩2更新，代价均为O(N^2)
+
+    # 常量
+    REFACTOR_INTERVAL = 64  # 增量更新次数达到该值时重新分解，抑制舍入误差的累积
+
+    # 初始化
+    def __init__(self, source, target, smoothing=0.0):
+        self.smoothing = smoothing  # 平滑参数λ
+        self.reset(source, target)  # 分解Gamma矩阵
+
+    # 重新设定映射坐标点并分解Gamma矩阵
+    def reset(self, source, target):
+        self.source = np.asarray(source, dtype=np.float64).reshape(-1, 2)  # 参考图像的映射坐标点
+        self.target = np.asarray(target, dtype=np.float64).reshape(-1, 2)  # 原始图像的映射坐标点
+        self.factorize()
+
+    # Gamma矩阵中映射坐标点v对应的列：[1, x, y, sigma(v - v1), ..., sigma(v - vn)]
+    def column(self, point):
+        kernel = Transform.radial_basis(np.sum((self.source - point)**2, axis=1))  # 与所有映射坐标点的径向基函数值
+        return np.concatenate(([1], point, kernel))
+
+    # 使用LU分解求逆矩阵，奇异时（映射坐标点少于3个或共线）在中心化坐标上取伪逆
+    def factorize(self):
+        number = len(self.source)  # 映射坐标点数量
+        P = np.hstack((np.ones((number, 1)), self.source))  # 仿射部分P = [1, X, Y]
+        S = Transform.radial_basis(np.sum((self.source[:, None, :] - self.source[None, :, :])**2, axis=2))  # 子矩阵S，Sij = sigma(vi - vj)
+        Gamma = np.block([[np.zeros((3, 3)), P.T], [P, S + self.smoothing * np.eye(number)]])  # Gamma矩阵
+        with warnings.catch_warnings():  # 奇异性由U的对角元判断，不需要警告
+            warnings.simplefilter('ignore', LinAlgWarning)
+            lu, pivot = lu_factor(Gamma, check_finite=False)  # LU分解
+        diagonal = np.abs(np.diag(lu))  # U的对角元
+        self.singular = number < 3 or np.min(diagonal) <= np.finfo(float).eps * len(diagonal) * np.max(diagonal)  # 判断Gamma矩阵是否奇异
+        if self.singular:  # 未中心化时常数项与线性项相互耦合，伪逆会把图像压缩至映射坐标点附近，因此与CSRBF相同在中心化坐标上求解
+            self.mean = np.mean(self.source, axis=0) if number else np.zeros(2)  # 映射坐标点的均值
+            P = np.hstack((np.ones((number, 1)), self.source - self.mean))  # 中心化的仿射部分
+            self.inverse = np.linalg.pinv(np.block([[np.zeros((3, 3)), P.T], [P, S + self.smoothing * np.eye(number)]]))  # 中心化Gamma矩阵的伪逆
+        else:
+            self.inverse = lu_solve((lu, pivot), np.eye(len(Gamma)))  # Gamma矩阵的逆
+        self.updates = 0  # 自上次分解以来的增量更新次数
+        self.parameter = None  # 形变函数系数需要重新计算
+
+    # 增量更新后检查是否需要重新分解
+    def refresh(self):
+        self.updates += 1  # 增量更新次数增加1
+        self.parameter = None  # 形变函数系数需要重新计算
+        if self.updates >= self.REFACTOR_INTERVAL:  # 累积误差可能过大
+            self.factorize()  # 重新分解
+
+    # 判断加边或降阶更新的主元是否过小
+    @staticmethod
+    def unstable(pivot, scale):
+        return abs(pivot) <= 1e-10 * max(1, scale)
+
+    # 增加一对映射坐标点：加边更新B' = [B + u @ uT / s, -u / s; -uT / s, 1 / s]
+    def add(self, source_point, target_point):
+        source_point = np.asarray(source_point, dtype=np.float64)  # 参考图像的映射坐标点
+        column = self.column(source_point)  # 新增的Gamma矩阵列
+        self.source = np.vstack((self.source, source_point))  # 记录映射坐标点
+        self.target = np.vstack((self.target, target_point))
+        if self.singular:  # 原矩阵奇异，无法加边更新
+            return self.factorize()
+        u = self.inverse @ column  # u = B @ g
+        pivot = self.smoothing - column @ u  # Schur补 s = λ - gT @ B @ g
+        if self.unstable(pivot, np.abs(column) @ np.abs(u)):  # 新矩阵接近奇异
+            return self.factorize()
+        self.inverse = np.block([
+            [self.inverse + np.outer(u, u) / pivot, -u[:, None] / pivot],
+            [-u[None, :] / pivot, np.array([[1 / pivot]])]
+        ])  # 加边更新
+        self.refresh()
+
+    # 删除第index对映射坐标点：降阶更新B' = B - b @ bT / beta，再删去对应的行与列
+    def remove(self, index):
+        j = 3 + index  # 映射坐标点在Gamma矩阵中的位置
+        self.source = np.delete(self.source, index, axis=0)  # 删除映射坐标点
+        self.target = np.delete(self.target, index, axis=0)
+        b, beta = self.inverse[:, j], self.inverse[j, j]  # B的第j列与第j个对角元
+        if self.singular or self.unstable(beta, np.max(np.abs(b))):  # 降阶后可能奇异，无法降阶更新
+            return self.factorize()
+        inverse = self.inverse - np.outer(b, b) / beta  # 降阶更新
+        self.inverse = np.delete(np.delete(inverse, j, axis=0), j, axis=1)  # 删去对应的行与列
+        self.refresh()
+
+    # 移动第index对映射坐标点：参考图像坐标改变时为秩2更新M' = M + e @ dT + d @ eT
+    def move(self, index, source_point=None, target_point=None):
+        if target_point is not None:  # 原始图像坐标仅影响Homolog矩阵
+            self.target[index] = target_point
+            self.parameter = None
+        if source_point is None or np.array_equal(source_point, self.source[index]):  # 参考图像坐标未改变
+            return
+        j = 3 + index  # 映射坐标点在Gamma矩阵中的位置
+        d = -self.column(self.source[index])  # 原Gamma矩阵列
+        self.source[index] = source_point  # 记录新位置
+        d += self.column(self.source[index])  # 列的变化量d，对角元的变化量为0
+        if self.singular:  # 原矩阵奇异，无法秩2更新
+            return self.factorize()
+        b, Bd = self.inverse[:, j], self.inverse @ d  # B @ e与B @ d
+        capacitance = np.eye(2) + np.array([[d @ b, d @ Bd], [b[j], Bd[j]]])  # I + VT @ B @ U，其中U = [e, d]，V = [d, e]
+        if self.unstable(np.linalg.det(capacitance), np.max(np.abs(capacitance))**2):  # 更新后接近奇异
+            return self.factorize()
+        self.inverse -= np.column_stack((b, Bd)) @ np.linalg.solve(capacitance, np.vstack((Bd, b)))  # Woodbury公式：B' = B - B @ U @ (I + VT @ B @ U)^(-1) @ VT @ B
+        self.refresh()
+
+    # 将映射坐标点同步为给定值，相同位置保持不变，移动的映射坐标点逐个更新，多出的删除，新增的追加
+    def update(self, source, target):
+        source = np.asarray(source, dtype=np.float64).reshape(-1, 2)  # 新的参考图像映射坐标点
+        target = np.asarray(target, dtype=np.float64).reshape(-1, 2)  # 新的原始图像映射坐标点
+        common = min(len(source), len(self.source))  # 共同部分的长度
+        moved = np.flatnonzero(np.any(source[:common] != self.source[:common], axis=1))  # 参考图像坐标发生变化的映射坐标点
+        if len(moved) + abs(len(source) - len(self.source)) > max(4, len(source) // 4):  # 变化过多时重新分解更快
+            return self.reset(source, target)
+        for index in moved:  # 移动发生变化的映射坐标点
+            self.move(index, source_point=source[index])
+        for index in range(len(self.source) - 1, len(source) - 1, -1):  # 从后往前删除多出的映射坐标点
+            self.remove(index)
+        for index in range(len(self.source), len(source)):  # 追加新增的映射坐标点
+            self.add(source[index], target[index])
+        if not np.array_equal(self.target, target):  # 原始图像坐标仅影响Homolog矩阵
+            self.target = target.copy()
+            self.parameter = None
+
+    # 形变函数系数[W; C; A] = Gamma^(-1) @ Homolog，由于Homolog的仿射部分为0，仅需B的后N列
+    # 奇异时伪逆作用于位移：v' = v + c + (v - m) @ D + WT @ s(v)，最小范数解在映射坐标点无法确定的方向上保持恒等变换，
+    # 如一对映射坐标点时为平移，共线时垂直于直线的方向不变
+    def parameters(self):
+        if self.parameter is None and self.singular:  # 映射坐标点发生变化后重新计算
+            c, D, W = np.vsplit(self.inverse[:, 3:] @ (self.target - self.source), [1, 3])  # 位移的形变函数系数
+            self.parameter = np.vstack((c - self.mean @ D, np.eye(2) + D, W))  # 换算为v' = C + v @ A + WT @ s(v)
+        elif self.parameter is None:
+            self.parameter = self.inverse[:, 3:] @ self.target  # 仿射部分在前：[C; A; W]
+        C, A, W = np.vsplit(self.parameter, [1, 3])  # 拆分形变函数系数
+        return W, C, A
+
+
+class DeformationField:
+    '''形变场，保存参考图像坐标至原始图像坐标的映射关系，可复合与近似求逆，多级形变最终只对图像重采样一次'''
+
+    # 形变场M(p) = p + u(p)，u为位移场；在非整数坐标处对位移场插值，形变场外部按复制边缘外推位移
+
+    # 初始化
+    def __init__(self, mapping_matrix, interpolation='bilinear'):
+        self.mapping_matrix = np.asarray(mapping_matrix)  # H*W*2的映射关系，坐标形式为(行, 列)
+        if not np.issubdtype(self.mapping_matrix.dtype, np.floating):  # 整数坐标转换为浮点数，float32保持不变
+            self.mapping_matrix = self.mapping_matrix.astype(np.float64)
+        self.shape = self.mapping_matrix.shape[:2]  # 形变场的高与宽
+        self.displacement = self.mapping_matrix - self.grid(self.shape, self.mapping_matrix.dtype)  # 位移场u
+        self.interpolation = interpolation  # 对形变场自身插值时的插值方式
+        self.resampler = Resampler(interpolation, 'replicate')  # 位移场的重采样器
+
+    # 形状为H*W*2的规则网格坐标
+    @staticmethod
+    def grid(shape, dtype=np.float64):
+        return np.moveaxis(np.indices(shape, dtype=dtype), 0, -1)  # 每个像素的(行, 列)坐标
+
+    # 恒等形变场
+    @classmethod
+    def identity(cls, shape, interpolation='bilinear'):
+        return cls(cls.grid(shape), interpolation)
+
+    # 在任意坐标（形状为...*2）处计算形变场：M(p) = p + u(p)
+    def __call__(self, coordinate):
+        coordinate = np.asarray(coordinate, dtype=self.mapping_matrix.dtype)  # 坐标矩阵
+        return coordinate + self.resampler.resample(self.displacement, coordinate)  # 对位移场插值
+
+    # 复合形变场：结果为p -> self(other(p))，即先按self变换、再按other变换的图像等价于按复合形变场变换一次
+    def compose(self, other):
+        return DeformationField(self(other.mapping_matrix), self.interpolation)  # 对形变场而非图像重采样
+
+    # 近似求逆形变场，逆形变场G(q) = q + v(q)满足M(G(q)) = q，不动点迭代v <- -u(q + v)，位移场的梯度较小时收敛
+    def invert(self, shape=None, iterations=50, tolerance=1e-3):
+        grid = self.grid(shape or self.shape, self.mapping_matrix.dtype)  # 逆形变场的定义域，默认与形变场相同
+        inverse = np.zeros_like(grid)  # 逆位移场v的初值
+        for _ in range(iterations):  # 不动点迭代
+            updated = -self.resampler.resample(self.displacement, grid + inverse)  # v = -u(q + v)
+            change = np.max(np.abs(updated - inverse)) if updated.size else 0  # 本次迭代的最大变化量
+            inverse = updated
+            if change < tolerance:  # 收敛
+                break
+        return DeformationField(grid + inverse, self.interpolation)
+
+    # 使用形变场对图像执行反向变换，按行带重采样以限制峰值内存
+    def apply(self, image, interpolation='bicubic', border='constant', band_height=256):
+        image_matrix = np.asarray(image)  # 图像矩阵，可为PIL.Image.Image格式的图像
+        resampler = Resampler(interpolation, border)  # 图像的重采样器
+        resultant_matrix = np.zeros(self.shape + image_matrix.shape[2:], dtype=image_matrix.dtype)  # 结果图像矩阵
+        for top in range(0, self.shape[0], band_height):  # 遍历行带
+            resultant_matrix[top:top + band_height] = resampler.resample(image_matrix, self.mapping_matrix[top:top + band_height])
+        return resultant_matrix
+
+
+class MLSDeformer:
+    '''移动最小二乘形变器，对固定的源映射坐标点预计算每个坐标点的权重与矩矩阵，目标映射坐标点改变时只需一次矩阵乘法'''
+
+    # 二维坐标以复数(行 + 列j)表示，相似变换与刚性变换的2*2矩阵[[a, b], [-b, a]]即为乘以复数a + bj
+    # 仿射：f(v) = K @ Q + v^ @ (I - M^+ @ M)，K_j = w_j / sum(w) + w_j * v^ @ M^+ @ p^_jT，M = sum(w_i * p^_iT @ p^_i)
+    # 相似：f(v) = K @ Q，K_j = w_j / sum(w) + w_j * v^ * conj(p^_j) / mu，mu = sum(w_i * |p^_i|^2)
+    # 刚性：f(v) = |v^| * m / |m| + (w / sum(w)) @ Q，m = sum(w_j * v^ * conj(p^_j) * q_j)
+    # 其中p*为源映射坐标点的加权平均，p^_j = p_j - p*，v^ = v - p*，由sum(w_j * p^_j) = 0，q^_j可直接替换为q_j
+
+    # 常量
+    MODES = ('affine', 'similarity', 'rigid')  # 支持的变换类型
+
+    # 初始化
+    def __init__(self, mode='affine', alpha=1.0, max_bytes=256 * 2**20):
+        if mode not in self.MODES:  # 不支持的变换类型
+            raise ValueError('Unknown MLS mode: %s' % mode)
+        self.mode = mode  # 变换类型
+        self.alpha = alpha  # 权重的距离指数，w_j = 1 / |p_j - v|^(2 * alpha)
+        self.max_bytes = max_bytes  # 预计算表的总大小上限，单位为字节，超过上限后不再缓存新的坐标点集
+        self.lock = threading.Lock()  # 多个线程同时计算分块时保护预计算表
+        self.reset(np.zeros((0, 2)))  # 清空预计算表
+
+    # 更换源映射坐标点，清空预计算表
+    def reset(self, source):
+        self.source = np.array(source, dtype=np.float64)  # 源映射坐标点
+        self.tables = dict()  # 预计算表，键为坐标点集的哈希值
+        self.table_bytes = 0  # 预计算表的总大小
+
+    # 设置源映射坐标点与变换类型，与当前不同时清空预计算表
+    def update(self, source, mode=None, alpha=None):
+        mode, alpha = mode or self.mode, self.alpha if alpha is None else alpha  # 未指定时保持不变
+        if mode not in self.MODES:  # 不支持的变换类型
+            raise ValueError('Unknown MLS mode: %s' % mode)
+        if mode != self.mode or alpha != self.alpha or not np.array_equal(source, self.source):  # 预计算表失效
+            self.mode, self.alpha = mode, alpha
+            self.reset(source)
+
+    # 对坐标点集预计算权重与矩矩阵，只依赖源映射坐标点与变换类型
+    def precompute(self, points):
+        p = self.source  # 源映射坐标点
+        distance = np.sum((points[:, None, :] - p[None, :, :])**2, axis=2)  # 坐标点至源映射坐标点的距离平方
+        w = np.maximum(distance, 1e-12)**(-self.alpha)  # 权重，与源映射坐标点重合时取极大的有限值
+        normalized = w / np.sum(w, axis=1, keepdims=True)  # 归一化权重
+        center = normalized @ p  # 加权平均p*
+        if self.mode == 'affine':  # 仿射变换在实数域计算
+            p_hat = p[None, :, :] - center[:, None, :]  # p^_j
+            v_hat = points - center  # v^
+            moment = np.einsum('nj,nja,njb->nab', w, p_hat, p_hat)  # 矩矩阵M
+            a = np.einsum('na,nab->nb', v_hat, np.linalg.pinv(moment))  # v^ @ M^+，矩矩阵奇异时取伪逆
+            K = normalized + w * np.einsum('nb,njb->nj', a, p_hat)  # 系数矩阵
+            offset = v_hat - np.einsum('nb,nbc->nc', a, moment)  # 零空间保持恒等：v^ @ (I - M^+ @ M)
+            return K, offset
+        p_hat = (p[:, 0] + 1j * p[:, 1])[None, :] - (center[:, 0] + 1j * center[:, 1])[:, None]  # 复数形式的p^_j
+        v_hat = (points[:, 0] + 1j * points[:, 1]) - (center[:, 0] + 1j * center[:, 1])  # 复数形式的v^
+        G = v_hat[:, None] * w * np.conj(p_hat)  # w_j * v^ * conj(p^_j)
+        if self.mode == 'similarity':  # 相似变换
+            mu = np.sum(w * np.abs(p_hat)**2, axis=1)  # mu
+            degenerate = mu == 0  # 只有一个源映射坐标点时相似变换不确定，取恒等变换
+            K = normalized + G / np.where(degenerate, 1, mu)[:, None]  # 系数矩阵
+            return K, np.where(degenerate, v_hat, 0)
+        return normalized, G, v_hat  # 刚性变换需要在矩阵乘法之后归一化
+
+    # 坐标点集的预计算表，总大小未超过上限时缓存
+    def table(self, points):
+        key = hashlib.sha1(np.ascontiguousarray(points).tobytes()).hexdigest()  # 坐标点集的哈希值
+        with self.lock:
+            table = self.tables.get(key)  # 查找预计算表
+        if table is None:  # 未缓存
+            table = self.precompute(points)
+            size = sum(part.nbytes for part in table)  # 预计算表的大小
+            with self.lock:
+                if self.table_bytes + size <= self.max_bytes:  # 未超过上限时缓存
+                    self.tables[key] = table
+                    self.table_bytes += size
+        return table
+
+    # 计算坐标点集在目标映射坐标点下的形变结果
+    def deform(self, points, target):
+        points = np.asarray(points, dtype=np.float64)  # n*2坐标矩阵
+        if self.mode == 'affine':  # 仿射变换
+            K, offset = self.table(points)
+            return K @ target + offset
+        q = target[:, 0] + 1j * target[:, 1]  # 复数形式的目标映射坐标点
+        if self.mode == 'similarity':  # 相似变换
+            K, offset = self.table(points)
+            result = K @ q + offset
+        else:  # 刚性变换
+            normalized, G, v_hat = self.table(points)
+            m = G @ q  # v^ * sum(w_j * conj(p^_j) * q_j)
+            length = np.abs(m)  # |m|
+            rotated = np.where(length > 0, m * np.abs(v_hat) / np.where(length > 0, length, 1), v_hat)  # |v^| * m / |m|，m为0时取恒等变换
+            result = rotated + normalized @ q
+        return np.stack([result.real, result.imag], axis=1)
+
+
+class Resampler:
+    '''规则网格重采样器，支持最近邻、双线性、双三次与Lanczos插值'''
+
+    # 常量
+    RADIUS = {'nearest': 1, 'bilinear': 1, 'bicubic': 2, 'lanczos': 3}  # 各插值核的支撑半径
+    BORDER = ('constant', 'replicate', 'reflect')  # 边界处理方式：常数填充、复制边缘、镜面反射
+
+    # 初始化
+    def __init__(self, method='bicubic', border='constant', fill=0):
+        if method not in self.RADIUS:  # 不支持的插值方式
+            raise ValueError('Unknown interpolation method: %s' % method)
+        if border not in self.BORDER:  # 不支持的边界处理方式
+            raise ValueError('Unknown border mode: %s' % border)
+        self.method = method  # 插值方式
+        self.border = border  # 边界处理方式
+        self.fill = fill  # 常数填充时边界外的像素值
+        self.radius = self.RADIUS[method]  # 插值核的支撑半径
+
+    # 双线性插值核
+    @staticmethod
+    def bilinear_kernel(t):
+        return np.maximum(0, 1 - np.abs(t))  # 三角形核
+
+    # 双三次插值核，采用Keys核（a = -0.5）
+    @staticmethod
+    def bicubic_kernel(t, a=-0.5):
+        t = np.abs(t)  # 核函数关于原点对称
+        return np.where(
+            t <= 1, (a + 2) * t**3 - (a + 3) * t**2 + 1,  # |t| <= 1
+            np.where(t < 2, a * t**3 - 5 * a * t**2 + 8 * a * t - 4 * a, 0)  # 1 < |t| < 2
+        )
+
+    # Lanczos插值核
+    def lanczos_kernel(self, t):
+        return np.where(np.abs(t) < self.radius, np.sinc(t) * np.sinc(t / self.radius), 0)  # sinc(t) * sinc(t / a)
+
+    # 将越界索引按边界处理方式映射回图像内部，返回映射后的索引与有效掩码
+    def remap(self, index, length):
+        if self.border == 'replicate':  # 复制边缘
+            return np.clip(index, 0, length - 1), None
+        elif self.border == 'reflect':  # 镜面反射，不重复边缘像素
+            if length == 1:  # 单像素边长时只能复制
+                return np.zeros_like(index), None
+            period = 2 * (length - 1)  # 反射周期
+            index = np.abs(index) % period  # 折叠至一个周期
+            return np.where(index < length, index, period - index), None
+        else:  # 常数填充
+            valid = (index >= 0) & (index < length)  # 位于图像内部的索引
+            return np.clip(index, 0, length - 1), valid
+
+    # 将一维坐标拆分为整数部分与小数部分，返回各抽头的索引、权重与有效掩码
+    def split_axis(self, coordinate, length):
+        if self.method == 'nearest':  # 最近邻插值只有一个抽头
+            index = np.floor(coordinate + 0.5).astype(np.intp)[:, None]  # 四舍五入得到最近的整数坐标
+            weight = np.ones(index.shape, dtype=coordinate.dtype)  # 权重为1
+        else:  # 其他插值使用2 * radius个抽头
+            base = np.floor(coordinate).astype(np.intp)  # 整数部分
+            fraction = coordinate - base  # 小数部分
+            offset = np.arange(1 - self.radius, self.radius + 1)  # 抽头相对整数部分的偏移
+            index = base[:, None] + offset  # 各抽头的索引
+            weight = getattr(self, '%s_kernel' % self.method)(fraction[:, None] - offset.astype(fraction.dtype))  # 各抽头的权重，与坐标的精度相同
+            weight /= np.sum(weight, axis=1, keepdims=True)  # 归一化权重，保证常数图像插值不变
+        index, valid = self.remap(index, length)  # 处理越界索引
+        if valid is not None:  # 常数填充时越界抽头不参与加权
+            weight = weight * valid
+        return index, weight
+
+    # 预先计算坐标的拆分结果，可在相同形状的多幅图像之间复用
+    def split(self, coordinate, shape):
+        coordinate = np.asarray(coordinate).reshape(-1, 2)  # 展平为n*2坐标矩阵
+        if not np.issubdtype(coordinate.dtype, np.floating):  # 整数坐标转换为浮点数，float32坐标保持单精度以节省带宽
+            coordinate = coordinate.astype(np.float64)
+        return (
+            self.split_axis(coordinate[:, 0], shape[0]),  # 垂直方向的索引与权重
+            self.split_axis(coordinate[:, 1], shape[1])  # 水平方向的索引与权重
+        )
+
+    # 使用预先拆分的坐标对图像的所有通道进行插值
+    def sample(self, image_matrix, splits):
+        (row_index, row_weight), (column_index, column_weight) = splits  # 两个方向的索引与权重
+        image = image_matrix.reshape(image_matrix.shape[0] * image_matrix.shape[1], -1)  # 展平为(H*W)*C的形式，以便按一维索引取值
+        row_offset = row_index * image_matrix.shape[1]  # 垂直方向抽头在展平图像中的偏移
+        result = np.zeros((row_index.shape[0], image.shape[1]), dtype=row_weight.dtype)  # 插值结果，与权重的精度相同
+        total_weight = np.zeros((row_index.shape[0], 1), dtype=row_weight.dtype)  # 有效抽头的权重之和
+        for i in range(row_index.shape[1]):  # 遍历垂直方向抽头
+            for j in range(column_index.shape[1]):  # 遍历水平方向抽头
+                weight = (row_weight[:, i] * column_weight[:, j])[:, None]  # 抽头的二维权重
+                result += weight * np.take(image, row_offset[:, i] + column_index[:, j], axis=0)  # 一次性累加所有通道
+                total_weight += weight  # 累计有效权重
+        result += self.fill * (1 - total_weight)  # 越界部分使用常数填充
+        if np.issubdtype(image_matrix.dtype, np.integer):  # 整数图像需要舍入并截断至取值范围
+            limit = np.iinfo(image_matrix.dtype)  # 数据类型的取值范围
+            result = np.clip(np.rint(result), limit.min, limit.max)
+        return result.astype(image_matrix.dtype).reshape(row_index.shape[:1] + image_matrix.shape[2:])  # 恢复数据类型与通道形状
+
+    # 在坐标矩阵（形状为...*2）给出的位置对图像重采样
+    def resample(self, image_matrix, coordinate):
+        coordinate = np.asarray(coordinate)  # 坐标矩阵
+        result = self.sample(image_matrix, self.split(coordinate, image_matrix.shape))  # 拆分坐标并插值
+        return result.reshape(coordinate.shape[:-1] + image_matrix.shape[2:])  # 恢复为坐标矩阵的形状
+
 
 if __name__ == '__main__':
     GUI().run()  # 主函数入口
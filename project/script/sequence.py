@@ -0,0 +1,100 @@
+import argparse  # 命令行操作
+import os  # 文件操作
+import time  # 时间操作
+from collections import deque  # 队列操作
+from concurrent.futures import ThreadPoolExecutor  # 并行操作
+
+from PIL import Image, ImageSequence  # 图像操作
+
+from main import GUI, Transform  # 图像变换器
+
+
+class SequenceWarper:
+    '''帧序列变换器，只计算一次形变场与重采样的抽头索引和权重，之后每帧只需重采样'''
+
+    # 初始化
+    def __init__(self, reference_image, mapping, algorithm='TPS', interpolation='bicubic', workers=None, **options):
+        self.reference_image = reference_image  # 参考图像，只用于确定结果图像的尺寸
+        self.mapping = mapping  # 参考图像坐标至原始图像坐标的映射关系
+        self.algorithm = algorithm  # 图像形变算法
+        self.interpolation = interpolation  # 插值方式
+        self.workers = workers or os.cpu_count() or 1  # 并行重采样的线程数量，默认为处理器核心数
+        self.options = options  # 传递给图像变换器的其他参数，如field_step、field_tolerance、smoothing
+        self.deformer = None  # 计算形变场的图像变换器，由第一帧建立
+        self.splits = None  # 预先拆分的抽头索引与权重，所有帧共用
+
+    # 从目录（按文件名排序的图像文件）或多页TIFF文件逐帧读取，生成(帧名称, 帧图像矩阵)
+    @staticmethod
+    def read_frames(source):
+        if os.path.isdir(source):  # 图像文件目录
+            for name in sorted(f for f in os.listdir(source) if f.lower().endswith(GUI.IMAGE_SUFFIX)):  # 按文件名排序
+                with Image.open(os.path.join(source, name)) as frame:
+                    yield os.path.splitext(name)[0], Transform.image_matrix(frame)  # 保留灰度与16位精度
+        else:  # 多页TIFF文件
+            with Image.open(source) as sequence:
+                for i, frame in enumerate(ImageSequence.Iterator(sequence)):  # 逐页读取
+                    yield 'frame_%05d' % i, Transform.image_matrix(frame)
+
+    # 由第一帧计算形变场，并预先拆分重采样的抽头索引与权重
+    def prepare(self, frame_matrix):
+        self.deformer = Transform(
+            frame_matrix, self.reference_image, self.mapping, self.algorithm,
+            interpolation=self.interpolation, workers=self.workers, **self.options
+        )  # 图像变换器
+        self.deformer.mapping_field()  # 只计算一次映射关系
+        self.splits = self.deformer.resampler.split(self.deformer.mapping_matrix, frame_matrix.shape)  # 所有帧共用的抽头索引与权重
+
+    # 使用预先拆分的抽头索引与权重对一帧重采样
+    def warp_frame(self, frame_matrix):
+        if frame_matrix.shape != self.deformer.ori_image_shape:  # 帧尺寸与第一帧不同时抽头索引失效
+            raise ValueError('Frame shape %s differs from %s' % (frame_matrix.shape, self.deformer.ori_image_shape))
+        result = self.deformer.resampler.sample(frame_matrix, self.splits)  # 重采样
+        return result.reshape(self.deformer.ref_image_shape + frame_matrix.shape[2:])
+
+    # 逐帧变换，生成(帧名称, 结果图像矩阵)，多帧在线程池中并行重采样，按输入顺序输出，同时处理的帧数有上限以限制内存
+    def warp(self, frames):
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:  # NumPy的取值与乘加运算会释放GIL
+            pending = deque()  # 正在处理的帧，按输入顺序排列
+            for name, frame_matrix in frames:  # 遍历帧
+                if self.splits is None:  # 第一帧
+                    self.prepare(frame_matrix)
+                pending.append((name, executor.submit(self.warp_frame, frame_matrix)))  # 提交重采样任务
+                if len(pending) >= 2 * self.workers:  # 达到上限时先输出最早的帧
+                    name, future = pending.popleft()
+                    yield name, future.result()
+            while pending:  # 输出剩余的帧
+                name, future = pending.popleft()
+                yield name, future.result()
+
+    # 变换帧序列并按顺序保存为png文件（PIL无法表示的16位RGB帧保存为npy文件），返回帧数量
+    def run(self, source, output_dir):
+        os.makedirs(output_dir, exist_ok=True)  # 新建输出目录
+        count = 0  # 已保存的帧数量
+        for count, (name, resultant_matrix) in enumerate(self.warp(self.read_frames(source)), 1):  # 逐帧变换
+            Transform.save_image(resultant_matrix, os.path.join(output_dir, name + '.png'))  # 保存结果帧
+        return count
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Warp every frame of a sequence with one deformation field.')  # 命令行参数
+    parser.add_argument('frames', help='directory of frame images or a multi-page TIFF file')
+    parser.add_argument('reference', help='reference image, only its size is used')
+    parser.add_argument('landmarks', help='CSV landmarks (original_x, original_y, reference_x, reference_y)')
+    parser.add_argument('-o', '--output', default='output', help='output directory for the warped frames')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='number of resampling threads (default: CPU count)')
+    parser.add_argument('-a', '--algorithm', default='TPS', help='transform algorithm (default: TPS)')
+    parser.add_argument('-i', '--interpolation', default='bicubic', choices=('nearest', 'bilinear', 'bicubic', 'lanczos'))
+    parser.add_argument('-t', '--tolerance', type=float, default=None, help='coarse-grid field checkpoint tolerance in pixels (default: exact)')
+    parser.add_argument('-p', '--precision', default='float64', choices=('float32', 'float64'), help='deformation field precision')
+    args = parser.parse_args()
+
+    warper = SequenceWarper(
+        Image.open(args.reference), Transform.load_landmarks(args.landmarks), args.algorithm, args.interpolation, args.workers,
+        field_step=8 if args.tolerance else 1, field_tolerance=args.tolerance, precision=args.precision
+    )  # 帧序列变换器
+    start = time.perf_counter()  # 开始时刻
+    count = warper.run(args.frames, args.output)  # 变换所有帧
+    elapsed = time.perf_counter() - start  # 总执行时间
+    field_time = warper.deformer.execute_time.get('field', 0.0) if warper.deformer else 0.0  # 形变场的计算时间
+    print('%d frames in %.2f s (field %.2f s, %.3f s per frame)' % (count, elapsed, field_time, (elapsed - field_time) / max(count, 1)))